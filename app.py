@@ -1,33 +1,188 @@
-from dotenv import load_dotenv
 import os
+import json
+import mimetypes
+import base64
+import hashlib
 import secrets
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-import google.generativeai as genai
-
-load_dotenv()
-
-app = Flask(__name__)
-
-# Configuration
-app.config['SECRET_KEY'] = secrets.token_hex(16)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mindbloom.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize extensions
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-
-# Gemini API key config
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', 'YOUR_GEMINI_API_KEY_HERE')
-if GEMINI_API_KEY != 'YOUR_GEMINI_API_KEY_HERE':
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("Warning: Gemini API key not configured. Using fallback responses.")
+import atexit
+import threading
+import time
+import click
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import groupby
+from flask import (Flask, Blueprint, Response, render_template, request, jsonify, redirect, url_for,
+                   stream_with_context, g, current_app, has_request_context, before_render_template,
+                   template_rendered, make_response, send_from_directory, abort)
+from sqlalchemy import event, inspect as sa_inspect, func, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from config import load_config
+from models import (db, User, Conversation, ArchivedConversation, Message, CrisisFlag, ConversationSummary,
+                    JobCheckpoint, MoodEntry, MoodDailyRollup)
+from archive import ConversationArchive
+from assets import AssetManifest, build_assets, HAS_BROTLI
+from llm_pool import LLMPool, LLMPoolBusy
+from prompt_context import split_by_budget, render_prompt, summary_prompt, fallback_summary
+from response_cache import ResponseCache, MemoryBackend, SQLiteBackend
+from sentiment import SentimentQueue, HAS_TEXTBLOB, score_texts
+import search
+from write_behind import WriteBehindQueue
+from summary_queue import SummaryQueue
+from hash_pool import HashPool, HashPoolBusy
+from rate_limit import TokenBucketLimiter
+from user_cache import UserCache, UserSnapshot
+from crisis import CrisisDetector, DEFAULT_PHRASES, DEFAULT_SOFT_PHRASES, load_phrases
+from model_backends import StubModel
+from db_metrics import DBStats
+from metrics import Registry, RequestTiming, SIZE_BUCKETS, COUNT_BUCKETS, family
+
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+# Routes, request hooks and CLI commands; registered on the app by create_app().
+main = Blueprint('main', __name__, cli_group=None)
+
+def set_sqlite_pragmas(config, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers proceed while a write is in progress; NORMAL sync is
+    # durable across application crashes and only fsyncs at checkpoints.
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']:d}")
+    cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA cache_size=-{config['SQLITE_CACHE_SIZE_KB']:d}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+db_stats = DBStats()
+if os.environ.get('BENCH_STATS_DIR'):
+    atexit.register(db_stats.dump, os.environ['BENCH_STATS_DIR'])
+
+# Request metrics, served by /metrics
+registry = Registry()
+http_requests = registry.counter(
+    'mindbloom_http_requests_total', 'Requests served.', ('method', 'endpoint', 'status'))
+http_request_seconds = registry.histogram(
+    'mindbloom_http_request_duration_seconds', 'Request time, including streaming the body.', ('endpoint',))
+request_phase_seconds = registry.histogram(
+    'mindbloom_request_phase_seconds', 'Time spent in one phase of a request.', ('endpoint', 'phase'))
+request_db_queries = registry.histogram(
+    'mindbloom_request_db_queries', 'SQL statements run by one request.', ('endpoint',), buckets=COUNT_BUCKETS)
+request_db_seconds = registry.histogram(
+    'mindbloom_request_db_seconds', 'Time one request spent executing SQL statements.', ('endpoint',))
+requests_in_flight = registry.gauge(
+    'mindbloom_requests_in_flight', 'Requests this worker is serving right now.')
+llm_seconds = registry.histogram(
+    'mindbloom_llm_call_seconds', 'Model call time, start to last chunk.', ('call',))
+llm_first_chunk_seconds = registry.histogram(
+    'mindbloom_llm_first_chunk_seconds', 'Time to the first chunk of a streamed reply.')
+llm_prompt_chars = registry.histogram(
+    'mindbloom_llm_prompt_chars', 'Prompt size sent to the model.', ('call',), buckets=SIZE_BUCKETS)
+llm_response_chars = registry.histogram(
+    'mindbloom_llm_response_chars', 'Reply size returned by the model.', ('call',), buckets=SIZE_BUCKETS)
+llm_errors = registry.counter(
+    'mindbloom_llm_errors_total', 'Model calls that raised an error.', ('call',))
+llm_in_flight = registry.gauge(
+    'mindbloom_llm_calls_in_flight', 'Model calls this worker is waiting on right now.')
+
+def current_timing():
+    return g.get('timing') if has_request_context() else None
+
+@contextmanager
+def request_phase(name):
+    """Add the enclosed block's time to ``name`` for the current request, if any."""
+    timing = current_timing()
+    if timing is None:
+        yield
+        return
+    with timing.phase(name):
+        yield
+
+def timed_chunks(chunks, phase):
+    """Yield from ``chunks``, counting only the time spent producing them."""
+    iterator = iter(chunks)
+    while True:
+        with request_phase(phase):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def record_request(app, timing, method, endpoint, status):
+    queries, db_seconds = db_stats.end_request()
+    total = timing.elapsed()
+    requests_in_flight.dec()
+    http_requests.inc(method=method, endpoint=endpoint, status=status)
+    http_request_seconds.observe(total, endpoint=endpoint)
+    request_db_queries.observe(queries, endpoint=endpoint)
+    request_db_seconds.observe(db_seconds, endpoint=endpoint)
+    for phase, seconds in timing.phases.items():
+        request_phase_seconds.observe(seconds, endpoint=endpoint, phase=phase)
+
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    if slow_ms and total * 1000 >= slow_ms:
+        phases = ' '.join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in sorted(timing.phases.items()))
+        app.logger.warning(
+            f"Slow request: {method} {endpoint} {status} {total * 1000:.0f}ms "
+            f"db={db_seconds * 1000:.0f}ms/{queries} queries {phases}".rstrip()
+        )
+
+@main.before_app_request
+def start_request_timing():
+    g.timing = RequestTiming()
+    db_stats.begin_request()
+    requests_in_flight.inc()
+
+@main.after_app_request
+def finish_request_timing(response):
+    timing = g.get('timing')
+    if timing is None:
+        return response
+    app = current_app._get_current_object()
+    method = request.method
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = response.status_code
+    g.timing_recorded = True
+    if response.is_streamed:
+        # Recorded once the body has been sent, so streamed replies are timed
+        # in full. g.timing stays set for the phases inside the stream.
+        response.call_on_close(lambda: record_request(app, timing, method, endpoint, status))
+    else:
+        record_request(app, timing, method, endpoint, status)
+    return response
+
+@main.teardown_app_request
+def abandon_request_timing(exc):
+    # Only reached without a response, when after_request itself failed.
+    timing = g.get('timing')
+    if timing is not None and not g.get('timing_recorded'):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        record_request(current_app._get_current_object(), timing, request.method, endpoint, 500)
+
+@before_render_template.connect
+def start_render_timing(sender, template, context, **extra):
+    if current_timing() is not None:
+        g.timing.start('render')
+
+@template_rendered.connect
+def stop_render_timing(sender, template, context, **extra):
+    if current_timing() is not None:
+        g.timing.stop('render')
+
+@event.listens_for(db.session, 'before_commit')
+def start_commit_timing(session):
+    if current_timing() is not None:
+        g.timing.start('commit')
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def stop_commit_timing(session):
+    if current_timing() is not None:
+        g.timing.stop('commit')
 
 # Persistent system instruction
 SYSTEM_PURPOSE = (
@@ -36,81 +191,352 @@ SYSTEM_PURPOSE = (
     "You are not a substitute for professional therapy. Keep answers empathetic and concise."
 )
 
-# Database Models
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
-    mood_entries = db.relationship('MoodEntry', backref='user', lazy=True, cascade='all, delete-orphan')
-
-class Conversation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    title = db.Column(db.String(200), default='New Conversation')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
-
-class Message(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    sender = db.Column(db.String(10), nullable=False)  # 'user' or 'bot'
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    sentiment_score = db.Column(db.Float, default=0.0)
-
-class MoodEntry(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    mood = db.Column(db.String(20), nullable=False)
-    intensity = db.Column(db.Integer, default=5)
-    notes = db.Column(db.Text)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+FALLBACK_UNAVAILABLE = "Sorry, AI service not available now."
+FALLBACK_ERROR = "Sorry, I'm having trouble connecting to the AI service. Please try again later."
+FALLBACK_BUSY = "I'm receiving a lot of messages right now. Please try again in a moment."
+FALLBACKS = (FALLBACK_UNAVAILABLE, FALLBACK_ERROR, FALLBACK_BUSY)
+# Yielded last by a reply stream that failed or timed out after part of the
+# reply was sent, so callers can tell a cut-off reply from a finished one.
+STREAM_CUT_SHORT = object()
+
+CRISIS_RESPONSE = (
+    "I'm really sorry you're feeling this way, and I'm glad you told me. You deserve support right now. "
+    "If you are in immediate danger, please call 988 (Suicide & Crisis Lifeline) or your local emergency number. "
+    "You can also text HOME to 741741 to reach the Crisis Text Line. Would you like to talk about what's happening?"
+)
+CRISIS_RESOURCES = [
+    {'name': 'Suicide & Crisis Lifeline', 'contact': 'Call or text 988', 'href': 'tel:988'},
+    {'name': 'Crisis Text Line', 'contact': 'Text HOME to 741741', 'href': 'sms:741741'},
+    {'name': 'SAMHSA National Helpline', 'contact': '1-800-662-4357', 'href': 'tel:1-800-662-4357'},
+]
+
+MODEL_NAME = 'gemini-2.5-flash'
+# Cached replies are only valid for the instruction and model that produced them.
+PROMPT_VERSION = hashlib.sha1((MODEL_NAME + SYSTEM_PURPOSE).encode()).hexdigest()[:12]
+
+def load_user_snapshot(user_id):
+    row = (
+        db.session.query(User.id, User.username, User.email, User.created_at)
+        .filter(User.id == user_id)
+        .first()
+    )
+    return UserSnapshot(*row) if row else None
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    if user_cache is not None:
+        user_cache.invalidate(target.id)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    with request_phase('load_user'):
+        if user_cache is None:
+            return db.session.get(User, int(user_id))
+        return user_cache.get(int(user_id))
 
 # Therapy Bot Wrapper
 class TherapyBot:
-    def __init__(self):
+    """Wraps the configured model. Gemini is imported and set up on first use.
+
+    google.generativeai takes longer to import than the rest of the app, so a
+    worker that never chats never pays for it. ``warm`` does the setup up
+    front; create_app calls it when MODEL_WARMUP is on.
+    """
+
+    def __init__(self, config):
+        self.backend = config['MODEL_BACKEND']
+        self.api_key = config['GEMINI_API_KEY']
+        self.stub_options = {
+            'latency_ms': config['STUB_LATENCY_MS'],
+            'jitter_ms': config['STUB_JITTER_MS'],
+            'chunks': config['STUB_CHUNKS'],
+            'error_rate': config['STUB_ERROR_RATE'],
+        }
+        self._model = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._model = self._load()
+                    self._loaded = True
+        return self._model
+
+    def _load(self):
+        if self.backend == 'stub':
+            return StubModel(**self.stub_options)
+        if not self.api_key:
+            return None
         try:
-            if GEMINI_API_KEY != 'YOUR_GEMINI_API_KEY_HERE':
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
-            else:
-                self.model = None
-                print("Warning: Gemini API key not configured. Using fallback responses.")
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            # Creating the model opens no connection, so this is safe before a fork.
+            return genai.GenerativeModel(MODEL_NAME)
         except Exception as e:
             print(f"Warning: Gemini API not configured properly: {e}")
-            self.model = None
+            return None
+
+    def warm(self):
+        return self.model
+
+    def complete(self, prompt, call):
+        """Return the model's full reply, recording it under ``call`` in the LLM metrics."""
+        llm_prompt_chars.observe(len(prompt), call=call)
+        started = time.perf_counter()
+        try:
+            with llm_in_flight.track():
+                text = self.model.generate_content(prompt).text
+        except Exception:
+            llm_errors.inc(call=call)
+            raise
+        finally:
+            llm_seconds.observe(time.perf_counter() - started, call=call)
+        llm_response_chars.observe(len(text), call=call)
+        return text
+
+    def reply(self, prompt):
+        if not self.model:
+            return FALLBACK_UNAVAILABLE
+        try:
+            return self.complete(prompt, 'reply')
+        except Exception:
+            return FALLBACK_ERROR
+
+    def stream(self, prompt):
+        """Yield reply text chunks as Gemini produces them."""
+        if not self.model:
+            yield FALLBACK_UNAVAILABLE
+            return
+        llm_prompt_chars.observe(len(prompt), call='stream')
+        started = time.perf_counter()
+        size = 0
+        emitted = False
+        llm_in_flight.inc()
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                text = chunk.text
+                if text:
+                    if not emitted:
+                        llm_first_chunk_seconds.observe(time.perf_counter() - started)
+                    emitted = True
+                    size += len(text)
+                    yield text
+        except Exception:
+            llm_errors.inc(call='stream')
+            # Once part of the reply has reached the client, end the stream
+            # rather than appending an error message to it.
+            yield STREAM_CUT_SHORT if emitted else FALLBACK_ERROR
+        finally:
+            llm_in_flight.dec()
+            llm_seconds.observe(time.perf_counter() - started, call='stream')
+            llm_response_chars.observe(size, call='stream')
+
+def write_sentiment_scores(app, scores):
+    with app.app_context():
+        db.session.bulk_update_mappings(Message, [{'id': i, 'sentiment_score': score} for i, score in scores])
+        db.session.commit()
+
+def write_messages(app, rows):
+    with app.app_context():
+        messages = [Message(**row) for row in rows]
+        db.session.add_all(messages)
+        db.session.commit()
+        enqueue_sentiment(*[(message, row['content']) for message, row in zip(messages, rows)])
+
+# Per-process helpers, built from the app's config by init_services().
+therapy_bot = None
+llm_pool = None
+sentiment_queue = None
+crisis_detector = None
+hash_pool = None
+user_login_limiter = None
+ip_login_limiter = None
+message_writer = None
+response_cache = None
+user_cache = None
+conversation_archive = None
+asset_manifest = None
+summary_queue = None
+
+def init_services(app):
+    """Build the helpers the routes use from ``app``'s config.
+
+    They are module globals shared by every request in the process, so there
+    is one configured app per process. Anything that owns threads or
+    processes starts them on first use, which keeps this safe to run in a
+    gunicorn --preload parent.
+    """
+    global therapy_bot, llm_pool, sentiment_queue, crisis_detector, hash_pool
+    global user_login_limiter, ip_login_limiter, message_writer, response_cache, user_cache, conversation_archive
+    global asset_manifest, summary_queue
+    config = app.config
+
+    therapy_bot = TherapyBot(config)
+    if config['MODEL_BACKEND'] == 'stub':
+        print("Using the stub model backend; replies are canned.")
+    elif not config['GEMINI_API_KEY']:
+        print("Warning: Gemini API key not configured. Using fallback responses.")
+    if config['MODEL_WARMUP']:
+        therapy_bot.warm()
+
+    llm_pool = None
+    if config['CHAT_EXECUTION_MODE'] == 'pool':
+        llm_pool = LLMPool(
+            max_workers=config['LLM_MAX_CONCURRENCY'],
+            max_pending=config['LLM_MAX_PENDING'],
+            timeout=config['LLM_TIMEOUT'],
+        )
+
+    sentiment_queue = None
+    if config['SENTIMENT_SCORING'] == 'queue':
+        if HAS_TEXTBLOB:
+            sentiment_queue = SentimentQueue(
+                partial(write_sentiment_scores, app),
+                batch_size=config['SENTIMENT_BATCH_SIZE'],
+                interval=config['SENTIMENT_FLUSH_INTERVAL'],
+            )
+        else:
+            print("Warning: textblob is not installed. Sentiment scoring disabled.")
+
+    summary_queue = SummaryQueue(
+        partial(run_in_app_context, app, update_summary),
+        workers=config['SUMMARY_WORKERS'],
+        max_pending=config['SUMMARY_MAX_PENDING'],
+    )
 
-therapy_bot = TherapyBot()
+    if config['CRISIS_PHRASES_FILE']:
+        phrases, soft_phrases = load_phrases(config['CRISIS_PHRASES_FILE'])
+    else:
+        phrases, soft_phrases = DEFAULT_PHRASES, DEFAULT_SOFT_PHRASES
+    crisis_detector = CrisisDetector(phrases, soft_phrases=soft_phrases)
+
+    hash_pool = HashPool(
+        workers=config['PASSWORD_HASH_WORKERS'],
+        max_queue=config['PASSWORD_HASH_QUEUE'],
+        timeout=config['PASSWORD_HASH_TIMEOUT'],
+    )
+    user_login_limiter = TokenBucketLimiter(config['LOGIN_RATE_PER_USER'], config['LOGIN_RATE_PER_USER'] / 60)
+    ip_login_limiter = TokenBucketLimiter(config['LOGIN_RATE_PER_IP'], config['LOGIN_RATE_PER_IP'] / 60)
+
+    message_writer = None
+    if config['MESSAGE_WRITE_BEHIND']:
+        message_writer = WriteBehindQueue(
+            partial(write_messages, app),
+            max_batch=config['WRITE_BEHIND_MAX_BATCH'],
+            interval=config['WRITE_BEHIND_INTERVAL'],
+        )
+
+    response_cache = None
+    if config['RESPONSE_CACHE'] == 'memory':
+        response_cache = ResponseCache(
+            MemoryBackend(config['RESPONSE_CACHE_MAX_ENTRIES'], config['RESPONSE_CACHE_TTL']),
+            version=PROMPT_VERSION,
+        )
+    elif config['RESPONSE_CACHE'] == 'sqlite':
+        os.makedirs(app.instance_path, exist_ok=True)
+        response_cache = ResponseCache(
+            SQLiteBackend(config['RESPONSE_CACHE_PATH'], config['RESPONSE_CACHE_MAX_ENTRIES'],
+                          config['RESPONSE_CACHE_TTL']),
+            version=PROMPT_VERSION,
+        )
+
+    user_cache = None
+    if config['USER_CACHE_TTL'] > 0:
+        user_cache = UserCache(
+            load_user_snapshot,
+            max_entries=config['USER_CACHE_MAX_ENTRIES'],
+            ttl=config['USER_CACHE_TTL'],
+        )
+
+    conversation_archive = ConversationArchive(config['ARCHIVE_DIR'])
+    asset_manifest = AssetManifest.load(config['ASSETS_DIR'])
+
+# Static assets and page shells
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+@main.app_template_global()
+def asset_url(filename):
+    """URL of a static file: its fingerprinted copy once build-assets has run."""
+    hashed = asset_manifest.hashed(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('main.asset', filename=hashed)
+
+@main.route('/assets/<path:filename>')
+def asset(filename):
+    """A fingerprinted static file, precompressed when the client accepts it."""
+    found = asset_manifest.variant(filename, lambda encoding: request.accept_encodings[encoding] > 0)
+    if found is None:
+        abort(404)
+    path, encoding = found
+    response = send_from_directory(asset_manifest.root, path, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+def shell_etag(template, vary):
+    """A tag that changes with the template file, the built assets and ``vary``."""
+    stat = os.stat(os.path.join(current_app.root_path, current_app.template_folder, template))
+    key = '|'.join(str(part) for part in (template, stat.st_mtime_ns, stat.st_size, asset_manifest.version, *vary))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def render_shell(template, vary=(), private=False, **context):
+    """Render a page shell, or answer 304 when the browser's copy is still current.
+
+    The ETag is worked out before rendering, so revalidating never runs
+    Jinja. ``vary`` lists anything else the page shows, such as the user.
+    """
+    etag = shell_etag(template, vary)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render_template(template, **context))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    if private:
+        response.headers['Vary'] = 'Cookie'
+    return response
 
 # Routes and login/register/logout
-@app.route('/')
+@main.route('/')
 def index():
     if current_user.is_authenticated:
-        return render_template('chat.html', user=current_user)
-    return redirect(url_for('login'))
+        return render_shell('chat.html', vary=(current_user.id, current_user.username), private=True,
+                            user=current_user)
+    return redirect(url_for('main.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         data = request.get_json()
         username = data.get('username')
         password = data.get('password')
 
+        # Throttle before touching the database or the expensive hash check.
+        if not ip_login_limiter.allow(request.remote_addr) or not user_login_limiter.allow(username):
+            return jsonify({'success': False, 'message': 'Too many login attempts. Please wait a minute and try again.'}), 429
+
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password_hash, password):
+        try:
+            with request_phase('password'):
+                valid = bool(user) and hash_pool.check(user.password_hash, password)
+        except (HashPoolBusy, FutureTimeoutError):
+            return jsonify({'success': False, 'message': 'The server is busy. Please try again in a moment.'}), 503
+        if valid:
             login_user(user)
             return jsonify({'success': True, 'message': 'Login successful'})
         else:
             return jsonify({'success': False, 'message': 'Invalid credentials'})
-    return render_template('login.html')
+    return render_shell('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         data = request.get_json()
@@ -118,30 +544,234 @@ def register():
         email = data.get('email')
         password = data.get('password')
 
+        if not ip_login_limiter.allow(request.remote_addr):
+            return jsonify({'success': False, 'message': 'Too many attempts. Please wait a minute and try again.'}), 429
+
         if User.query.filter_by(username=username).first():
             return jsonify({'success': False, 'message': 'Username already exists'})
         if User.query.filter_by(email=email).first():
             return jsonify({'success': False, 'message': 'Email already registered'})
 
+        try:
+            with request_phase('password'):
+                password_hash = hash_pool.generate(password)
+        except (HashPoolBusy, FutureTimeoutError):
+            return jsonify({'success': False, 'message': 'The server is busy. Please try again in a moment.'}), 503
+
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password)
+            password_hash=password_hash
         )
         db.session.add(user)
         db.session.commit()
 
         login_user(user)
         return jsonify({'success': True, 'message': 'Registration successful'})
-    return render_template('register.html')
+    return render_shell('register.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
+    if user_cache is not None:
+        user_cache.invalidate(current_user.id)
     logout_user()
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
+
+def load_unsummarized(conversation_id):
+    """Return the stored summary row and the newest turns not yet folded into it."""
+    summary = db.session.get(ConversationSummary, conversation_id)
+    query = Message.query.filter(Message.conversation_id == conversation_id)
+    if summary:
+        query = query.filter(Message.id > summary.last_message_id)
+    rows = query.order_by(Message.id.desc()).limit(current_app.config['CONTEXT_MAX_MESSAGES']).all()
+    rows.reverse()
+    return summary, rows
+
+def build_prompt(conversation_id, user_message):
+    summary, rows = load_unsummarized(conversation_id)
+    _, recent = split_by_budget([(m.sender, m.content) for m in rows], current_app.config['CONTEXT_TOKEN_BUDGET'])
+    return render_prompt(SYSTEM_PURPOSE, user_message, summary.summary if summary else None, recent)
+
+def summarize_turns(previous, turns):
+    max_tokens = current_app.config['CONTEXT_SUMMARY_TOKENS']
+    if therapy_bot.model:
+        try:
+            return therapy_bot.complete(summary_prompt(previous, turns, max_tokens), 'summary').strip()
+        except Exception:
+            pass
+    return fallback_summary(previous, turns, max_tokens)
+
+def update_summary(conversation_id):
+    """Fold turns that no longer fit the context budget into the rolling summary."""
+    budget = current_app.config['CONTEXT_TOKEN_BUDGET']
+    summary, rows = load_unsummarized(conversation_id)
+    turns = [(m.sender, m.content) for m in rows]
+    older, _ = split_by_budget(turns, budget)
+    if not older and len(rows) < current_app.config['CONTEXT_MAX_MESSAGES']:
+        return
+
+    # Fold down to half the budget so the summary is refreshed in batches
+    # rather than on every turn.
+    older, _ = split_by_budget(turns, budget // 2)
+    boundary_id = rows[len(older)].id if len(older) < len(rows) else rows[-1].id + 1
+    last_id = summary.last_message_id if summary else 0
+    to_fold = (
+        Message.query
+        .filter(Message.conversation_id == conversation_id, Message.id > last_id, Message.id < boundary_id)
+        .order_by(Message.id)
+        .limit(current_app.config['CONTEXT_FOLD_BATCH'])
+        .all()
+    )
+    if not to_fold:
+        return
+
+    new_summary = summarize_turns(summary.summary if summary else '', [(m.sender, m.content) for m in to_fold])
+    # Concurrent turns may fold the same conversation; only ever move the
+    # summary forward so the later fold wins and nothing is applied twice.
+    stmt = sqlite_insert(ConversationSummary).values(
+        conversation_id=conversation_id, summary=new_summary,
+        last_message_id=to_fold[-1].id, updated_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['conversation_id'],
+        set_={
+            'summary': stmt.excluded.summary,
+            'last_message_id': stmt.excluded.last_message_id,
+            'updated_at': stmt.excluded.updated_at,
+        },
+        where=ConversationSummary.last_message_id < stmt.excluded.last_message_id,
+    ))
+    db.session.commit()
+
+def run_in_app_context(app, fn, *args):
+    with app.app_context():
+        return fn(*args)
+
+def schedule_summary_update(conversation_id):
+    # The fold may call the model again, so it never holds up the reply.
+    summary_queue.put(conversation_id)
+
+def get_or_create_conversation(conversation_id, user_message):
+    if conversation_id:
+        conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+        return conversation or restore_archived_conversation(conversation_id)
+    conversation = Conversation(user_id=current_user.id, title=user_message[:50])
+    db.session.add(conversation)
+    db.session.flush()
+    return conversation
+
+def restore_archived_conversation(conversation_id):
+    """Move one of the current user's archived conversations back into the live tables.
+
+    Returns the restored Conversation, or None if there is no such archive.
+    The archive file keeps the old copy; nothing refers to it any more.
+    """
+    archived = ArchivedConversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+    if archived is None:
+        return None
+    record = conversation_archive.read(archived.user_id, archived.archive_offset, archived.archive_length)
+    conversation = Conversation(id=archived.id, user_id=archived.user_id, title=record['title'],
+                                created_at=datetime.fromisoformat(record['created_at']))
+    db.session.add(conversation)
+    db.session.delete(archived)
+    db.session.flush()
+    db.session.bulk_insert_mappings(Message, [
+        {'id': m['id'], 'conversation_id': conversation.id, 'content': m['content'], 'sender': m['sender'],
+         'timestamp': datetime.fromisoformat(m['timestamp']), 'sentiment_score': m['sentiment_score']}
+        for m in record['messages']
+    ])
+    db.session.bulk_insert_mappings(CrisisFlag, [
+        {'message_id': m['id'], 'matched': m['crisis']['matched'],
+         'created_at': datetime.fromisoformat(m['crisis']['created_at'])}
+        for m in record['messages'] if m['crisis']
+    ])
+    if record['summary']:
+        db.session.add(ConversationSummary(conversation_id=conversation.id, **record['summary']))
+    return conversation
+
+def pooled_reply(prompt):
+    try:
+        return llm_pool.run(therapy_bot.reply, prompt)
+    except LLMPoolBusy:
+        return FALLBACK_BUSY
+    except FutureTimeoutError:
+        return FALLBACK_ERROR
+
+def pooled_stream(prompt):
+    """Stream a reply produced on the LLM pool, with the same fallbacks as pooled_reply."""
+    try:
+        chunks = llm_pool.stream(therapy_bot.stream, prompt)
+    except LLMPoolBusy:
+        yield FALLBACK_BUSY
+        return
+    emitted = False
+    try:
+        for text in chunks:
+            emitted = True
+            yield text
+    except FutureTimeoutError:
+        # Keep what already reached the client rather than appending an error.
+        yield STREAM_CUT_SHORT if emitted else FALLBACK_ERROR
+    finally:
+        chunks.close()
+
+def add_message(conversation_id, content, sender):
+    """Add a message to the current transaction, or hand it to the write-behind queue.
+
+    Returns the pending Message, or None when the write-behind queue owns it.
+    """
+    if message_writer is None:
+        message = Message(conversation_id=conversation_id, content=content, sender=sender)
+        db.session.add(message)
+        return message
+    # The writer inserts from its own session, so a newly created
+    # conversation has to be committed before its messages are queued.
+    db.session.commit()
+    message_writer.put({
+        'conversation_id': conversation_id,
+        'content': content,
+        'sender': sender,
+        'timestamp': datetime.utcnow(),
+    })
+    return None
+
+def add_crisis_message(conversation_id, content, matched):
+    """Store a flagged user message in the current transaction.
+
+    Flagged messages never go through the write-behind queue, so they are
+    durable as soon as the request commits.
+    """
+    message = Message(conversation_id=conversation_id, content=content, sender='user')
+    db.session.add(message)
+    db.session.add(CrisisFlag(message=message, matched=', '.join(matched)))
+    return message
+
+def answers_with_crisis_response(matched):
+    """Whether the canned crisis reply replaces the model's for these matches."""
+    return (bool(matched) and current_app.config['CRISIS_MODE'] != 'parallel'
+            and not crisis_detector.resources_only(matched))
+
+def crisis_payload(matched):
+    return {'matched': matched, 'resources': CRISIS_RESOURCES}
+
+def enqueue_sentiment(*messages):
+    """Queue committed ``(Message, content)`` pairs for background scoring."""
+    if sentiment_queue is None:
+        return
+    for message, content in messages:
+        if message is None:
+            continue  # Scored by write_messages once the write-behind queue stores it.
+        # The identity comes from session state, so an expired object is not reloaded.
+        sentiment_queue.put(sa_inspect(message).identity[0], content)
 
-@app.route('/api/chat', methods=['POST'])
+def uses_response_cache(conversation_id, user_message):
+    # Only openers are cached; later turns depend on the conversation so far.
+    return response_cache is not None and not conversation_id and response_cache.cacheable(user_message)
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+@main.route('/api/chat', methods=['POST'])
 @login_required
 def chat():
     data = request.get_json()
@@ -151,37 +781,749 @@ def chat():
     if not user_message:
         return jsonify({'error': 'Message cannot be empty'}), 400
 
-    if conversation_id:
-        conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+    crisis_matches = crisis_detector.find(user_message)
+    use_cache = not crisis_matches and uses_response_cache(conversation_id, user_message)
+    conversation = get_or_create_conversation(conversation_id, user_message)
+    if conversation is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+
+    conversation_id = conversation.id
+    with request_phase('prompt'):
+        prompt = build_prompt(conversation_id, user_message)
+
+    if crisis_matches:
+        user_msg = add_crisis_message(conversation_id, user_message, crisis_matches)
+    else:
+        user_msg = add_message(conversation_id, user_message, 'user')
+
+    bot_response = response_cache.get(user_message) if use_cache else None
+    if answers_with_crisis_response(crisis_matches):
+        bot_response = CRISIS_RESPONSE
+    if bot_response is None:
+        if llm_pool is not None:
+            # End the write transaction before waiting on the model so other
+            # writers are not serialized behind it.
+            db.session.commit()
+            with request_phase('llm'):
+                bot_response = pooled_reply(prompt)
+        else:
+            with request_phase('llm'):
+                bot_response = therapy_bot.reply(prompt)
+        if use_cache and bot_response not in FALLBACKS:
+            response_cache.set(user_message, bot_response)
+
+    bot_msg = add_message(conversation_id, bot_response, 'bot')
+    db.session.commit()
+    enqueue_sentiment((user_msg, user_message), (bot_msg, bot_response))
+    schedule_summary_update(conversation_id)
+
+    result = {'response': bot_response, 'conversation_id': conversation_id}
+    if crisis_matches:
+        result['crisis'] = crisis_payload(crisis_matches)
+    return jsonify(result)
+
+@main.route('/api/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    data = request.get_json()
+    user_message = data.get('message', '').strip()
+    conversation_id = data.get('conversation_id')
+
+    if not user_message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+
+    crisis_matches = crisis_detector.find(user_message)
+    use_cache = not crisis_matches and uses_response_cache(conversation_id, user_message)
+    conversation = get_or_create_conversation(conversation_id, user_message)
+    if conversation is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+
+    # Commit the user's message before streaming so it survives a client
+    # disconnect or a failed model call.
+    conversation_id = conversation.id
+    with request_phase('prompt'):
+        prompt = build_prompt(conversation_id, user_message)
+    if crisis_matches:
+        user_msg = add_crisis_message(conversation_id, user_message, crisis_matches)
     else:
-        conversation = Conversation(user_id=current_user.id, title=user_message[:50])
-        db.session.add(conversation)
-        db.session.flush()
+        user_msg = add_message(conversation_id, user_message, 'user')
+    db.session.commit()
+    enqueue_sentiment((user_msg, user_message))
 
-    user_msg = Message(conversation_id=conversation.id, content=user_message, sender='user')
-    db.session.add(user_msg)
+    # A reply that is known up front (cache hit or crisis response) is sent as one chunk.
+    ready_reply = response_cache.get(user_message) if use_cache else None
+    if answers_with_crisis_response(crisis_matches):
+        ready_reply = CRISIS_RESPONSE
+
+    def generate():
+        chunks = []
+        cut_short = False
+        try:
+            yield sse_event({'type': 'start', 'conversation_id': conversation_id})
+            if crisis_matches:
+                # Sent before any model output so the client can show help right away.
+                yield sse_event({'type': 'crisis', **crisis_payload(crisis_matches)})
+            if ready_reply is not None:
+                source = [ready_reply]
+            elif llm_pool is not None:
+                source = timed_chunks(pooled_stream(prompt), 'llm')
+            else:
+                source = timed_chunks(therapy_bot.stream(prompt), 'llm')
+            for text in source:
+                if text is STREAM_CUT_SHORT:
+                    cut_short = True
+                    continue
+                chunks.append(text)
+                yield sse_event({'type': 'chunk', 'text': text})
+            done = {'type': 'done', 'conversation_id': conversation_id}
+            if cut_short:
+                # The model failed or timed out partway; the partial reply is still saved.
+                done['truncated'] = True
+            yield sse_event(done)
+            if use_cache and ready_reply is None and not cut_short and ''.join(chunks) not in FALLBACKS:
+                response_cache.set(user_message, ''.join(chunks))
+        finally:
+            # Runs on normal completion and on GeneratorExit when the client
+            # goes away; whatever was generated so far is kept.
+            bot_response = ''.join(chunks)
+            if bot_response:
+                bot_msg = add_message(conversation_id, bot_response, 'bot')
+                db.session.commit()
+                enqueue_sentiment((bot_msg, bot_response))
+                schedule_summary_update(conversation_id)
 
-    prompt = SYSTEM_PURPOSE + "\nUser: " + user_message + "\nAI:"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+def record_mood_rollup(user_id, day, mood, intensity):
+    stmt = sqlite_insert(MoodDailyRollup).values(
+        user_id=user_id, day=day, mood=mood, count=1, intensity_sum=intensity)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'day', 'mood'],
+        set_={
+            'count': MoodDailyRollup.count + 1,
+            'intensity_sum': MoodDailyRollup.intensity_sum + intensity,
+        },
+    ))
+
+@main.route('/api/mood', methods=['POST'])
+@login_required
+def log_mood():
+    data = request.get_json()
+    mood = (data.get('mood') or '').strip()
+    intensity = data.get('intensity', 5)
+    notes = data.get('notes')
+
+    if not mood or len(mood) > 20:
+        return jsonify({'error': 'Mood must be 1-20 characters'}), 400
+    if not isinstance(intensity, int) or not 1 <= intensity <= 10:
+        return jsonify({'error': 'Intensity must be a whole number from 1 to 10'}), 400
+
+    now = datetime.utcnow()
+    entry = MoodEntry(user_id=current_user.id, mood=mood, intensity=intensity, notes=notes, timestamp=now)
+    db.session.add(entry)
+    record_mood_rollup(current_user.id, now.date(), mood, intensity)
+    db.session.commit()
+
+    return jsonify({'success': True, 'id': entry.id, 'timestamp': now.isoformat()})
+
+@main.route('/api/mood/trends')
+@login_required
+def mood_trends():
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = (
+        MoodDailyRollup.query
+        .filter(MoodDailyRollup.user_id == current_user.id, MoodDailyRollup.day >= start)
+        .order_by(MoodDailyRollup.day, MoodDailyRollup.mood)
+        .all()
+    )
+    return jsonify({
+        'days': days,
+        'start': start.isoformat(),
+        'trends': [
+            {
+                'date': row.day.isoformat(),
+                'mood': row.mood,
+                'count': row.count,
+                'mean_intensity': round(row.intensity_sum / row.count, 2),
+            }
+            for row in rows
+        ],
+    })
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 100
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, id)`` from a cursor, or None if it is malformed."""
     try:
-        if therapy_bot.model:
-            gemini_response = therapy_bot.model.generate_content(prompt)
-            bot_response = gemini_response.text
-        else:
-            bot_response = "Sorry, AI service not available now."
-    except Exception:
-        bot_response = "Sorry, I'm having trouble connecting to the AI service. Please try again later."
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def page_args():
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def serialize_message(message):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender': message.sender,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+@main.route('/api/conversations')
+@login_required
+def list_conversations():
+    """Newest conversations first, each with its latest message."""
+    limit, cursor = page_args()
+    if request.args.get('cursor') and cursor is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    # Correlated LIMIT 1 lookup per conversation: each is a seek on
+    # ix_message_conversation_timestamp, and the page loads in one query.
+    latest_id = (
+        db.select(Message.id)
+        .where(Message.conversation_id == Conversation.id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(1)
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    query = (
+        db.session.query(Conversation, Message)
+        .outerjoin(Message, Message.id == latest_id)
+        .filter(Conversation.user_id == current_user.id)
+    )
+    archived_query = ArchivedConversation.query.filter(ArchivedConversation.user_id == current_user.id)
+    if cursor:
+        query = query.filter(tuple_(Conversation.created_at, Conversation.id) < cursor)
+        archived_query = archived_query.filter(
+            tuple_(ArchivedConversation.created_at, ArchivedConversation.id) < cursor)
+    rows = query.order_by(Conversation.created_at.desc(), Conversation.id.desc()).limit(limit + 1).all()
+    archived = (
+        archived_query.order_by(ArchivedConversation.created_at.desc(), ArchivedConversation.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    # Live and archived conversations share one id sequence, so a page
+    # is the newest limit + 1 of both.
+    entries = [
+        (conversation.created_at, conversation.id, {
+            'id': conversation.id,
+            'title': conversation.title,
+            'created_at': conversation.created_at.isoformat(),
+            'last_message': serialize_message(message) if message else None,
+            'archived': False,
+        })
+        for conversation, message in rows
+    ] + [
+        (conversation.created_at, conversation.id, {
+            'id': conversation.id,
+            'title': conversation.title,
+            'created_at': conversation.created_at.isoformat(),
+            'last_message': json.loads(conversation.last_message) if conversation.last_message else None,
+            'archived': True,
+        })
+        for conversation in archived
+    ]
+    entries.sort(key=lambda entry: entry[:2], reverse=True)
+
+    page = entries[:limit]
+    next_cursor = encode_cursor(*page[-1][:2]) if len(entries) > limit else None
+    return jsonify({
+        'conversations': [entry for _, _, entry in page],
+        'next_cursor': next_cursor,
+    })
+
+@main.route('/api/conversations/<int:conversation_id>/messages')
+@login_required
+def list_messages(conversation_id):
+    """One page of messages in chronological order; ``next_cursor`` pages back in time."""
+    limit, cursor = page_args()
+    if request.args.get('cursor') and cursor is None:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+    if conversation is None:
+        archived = ArchivedConversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+        if archived is None:
+            return jsonify({'error': 'Conversation not found'}), 404
+        return jsonify(archived_messages_page(archived, limit, cursor))
+
+    query = Message.query.filter(Message.conversation_id == conversation_id)
+    if cursor:
+        query = query.filter(tuple_(Message.timestamp, Message.id) < cursor)
+    rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
 
-    bot_msg = Message(conversation_id=conversation.id, content=bot_response, sender='bot')
-    db.session.add(bot_msg)
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None
+    return jsonify({
+        'conversation_id': conversation_id,
+        'messages': [serialize_message(message) for message in reversed(page)],
+        'next_cursor': next_cursor,
+    })
+
+def archived_messages_page(archived, limit, cursor):
+    """The list_messages response for an archived conversation, paged the same way."""
+    record = conversation_archive.read(archived.user_id, archived.archive_offset, archived.archive_length)
+    messages = [
+        m for m in record['messages']
+        if cursor is None or (datetime.fromisoformat(m['timestamp']), m['id']) < cursor
+    ]
+    page = messages[-limit:]
+    next_cursor = None
+    if len(messages) > limit:
+        next_cursor = encode_cursor(datetime.fromisoformat(page[0]['timestamp']), page[0]['id'])
+    return {
+        'conversation_id': archived.id,
+        'messages': [{key: m[key] for key in ('id', 'content', 'sender', 'timestamp')} for m in page],
+        'next_cursor': next_cursor,
+        'archived': True,
+    }
+
+EXPORT_BATCH_ROWS = 500
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def export_conversation_line(conversation_id, title, created_at, archived):
+    return {'type': 'conversation', 'id': conversation_id, 'title': title, 'created_at': created_at,
+            'archived': archived}
+
+def export_message_line(conversation_id, message_id, content, sender, timestamp, sentiment_score):
+    return {'type': 'message', 'conversation_id': conversation_id, 'id': message_id, 'content': content,
+            'sender': sender, 'timestamp': timestamp, 'sentiment_score': sentiment_score}
+
+def export_records(user_id):
+    """Yield a user's conversations, each followed by its messages, as export dicts.
+
+    Live rows come from one query read ``EXPORT_BATCH_ROWS`` at a time, so
+    memory stays flat however long the history is. Archived conversations
+    follow, one archive read each. A conversation archived while an export
+    runs can show up twice, but never goes missing.
+    """
+    rows = db.session.execute(
+        db.select(Conversation.id, Conversation.title, Conversation.created_at,
+                  Message.id.label('message_id'), Message.content, Message.sender, Message.timestamp,
+                  Message.sentiment_score)
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .where(Conversation.user_id == user_id)
+        .order_by(Conversation.created_at, Conversation.id, Message.timestamp, Message.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    current_id = None
+    for row in rows:
+        if row.id != current_id:
+            current_id = row.id
+            yield export_conversation_line(row.id, row.title, row.created_at.isoformat(), False)
+        if row.message_id is not None:
+            yield export_message_line(row.id, row.message_id, row.content, row.sender, row.timestamp.isoformat(),
+                                      row.sentiment_score)
+
+    archived = db.session.execute(
+        db.select(ArchivedConversation.id, ArchivedConversation.archive_offset, ArchivedConversation.archive_length)
+        .where(ArchivedConversation.user_id == user_id)
+        .order_by(ArchivedConversation.created_at, ArchivedConversation.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    for row in archived:
+        record = conversation_archive.read(user_id, row.archive_offset, row.archive_length)
+        yield export_conversation_line(row.id, record['title'], record['created_at'], True)
+        for m in record['messages']:
+            yield export_message_line(row.id, m['id'], m['content'], m['sender'], m['timestamp'],
+                                      m['sentiment_score'])
+
+def ndjson_chunks(records):
+    """Encode records as NDJSON, grouped into chunks of about EXPORT_CHUNK_BYTES."""
+    lines = []
+    size = 0
+    for record in records:
+        line = json.dumps(record) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield ''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield ''.join(lines)
+
+@main.route('/api/export')
+@login_required
+def export_conversations():
+    """Every conversation and message of the current user, streamed as NDJSON."""
+    return Response(
+        stream_with_context(ndjson_chunks(export_records(current_user.id))),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename="mindbloom-export.ndjson"'},
+    )
+
+@main.route('/api/search')
+@login_required
+def search_history():
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    if not query:
+        return jsonify({'error': 'Search query cannot be empty'}), 400
+
+    try:
+        rows = search.search_messages(db.session, current_user.id, query, limit)
+    except search.SearchUnavailable:
+        return jsonify({'error': 'Search unavailable'}), 503
+    return jsonify({
+        'query': query,
+        'results': [
+            {
+                'message_id': row['id'],
+                'conversation_id': row['conversation_id'],
+                'conversation_title': row['title'],
+                'sender': row['sender'],
+                'timestamp': row['timestamp'].isoformat(),
+                'snippet': search.snippet_html(row['snippet']),
+                'rank': row['rank'],
+            }
+            for row in rows
+        ],
+    })
+
+@main.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    if response_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **response_cache.stats()})
+
+@main.cli.command('backfill-sentiment')
+@click.option('--chunk-size', default=2000, show_default=True, help='Messages read and scored per batch.')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Scoring processes.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and rescore everything.')
+def backfill_sentiment(chunk_size, workers, restart):
+    """Score existing messages in id order, resuming from the last checkpoint."""
+    if not HAS_TEXTBLOB:
+        raise click.ClickException('textblob is not installed.')
+
+    checkpoint = db.session.get(JobCheckpoint, 'sentiment')
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name='sentiment', last_id=0)
+        db.session.add(checkpoint)
+    if restart:
+        checkpoint.last_id = 0
+    db.session.commit()
+
+    def chunks(after_id):
+        while True:
+            rows = (
+                db.session.query(Message.id, Message.content)
+                .filter(Message.id > after_id)
+                .order_by(Message.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                return
+            after_id = rows[-1].id
+            yield rows
+
+    scored = 0
+
+    def write(rows, future):
+        nonlocal scored
+        scores = future.result()
+        db.session.bulk_update_mappings(
+            Message, [{'id': row.id, 'sentiment_score': score} for row, score in zip(rows, scores)])
+        # Saved in the same transaction as the scores, so a rerun after a
+        # crash picks up exactly where the last committed chunk ended.
+        checkpoint.last_id = rows[-1].id
+        db.session.commit()
+        scored += len(rows)
+        click.echo(f"Scored {scored} messages (through id {checkpoint.last_id})")
+
+    # Keep a bounded number of chunks in flight instead of letting
+    # Executor.map read the whole table up front.
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rows in chunks(checkpoint.last_id):
+            pending.append((rows, pool.submit(score_texts, [row.content for row in rows])))
+            if len(pending) >= workers * 2:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+    click.echo(f"Done. Scored {scored} messages.")
+
+@main.cli.command('rebuild-mood-rollups')
+def rebuild_mood_rollups():
+    """Recompute mood_daily_rollup from every MoodEntry."""
+    day = func.date(MoodEntry.timestamp)
+    totals = (
+        db.session.query(MoodEntry.user_id, day, MoodEntry.mood,
+                         func.count(), func.sum(func.coalesce(MoodEntry.intensity, 5)))
+        .group_by(MoodEntry.user_id, day, MoodEntry.mood)
+        .all()
+    )
+    MoodDailyRollup.query.delete()
+    db.session.bulk_insert_mappings(MoodDailyRollup, [
+        {'user_id': user_id, 'day': datetime.strptime(d, '%Y-%m-%d').date(), 'mood': mood,
+         'count': count, 'intensity_sum': intensity_sum}
+        for user_id, d, mood, count, intensity_sum in totals
+    ])
     db.session.commit()
+    click.echo(f"Rebuilt {len(totals)} mood rollup rows.")
 
-    return jsonify({'response': bot_response, 'conversation_id': conversation.id})
+@main.cli.command('build-search-index')
+def build_search_index():
+    """Create the FTS5 message index if needed and (re)build it from every message."""
+    with db.engine.begin() as connection:
+        search.ensure_index(connection)
+        search.rebuild_index(connection)
+    click.echo("Search index rebuilt.")
 
-def init_db():
+def archive_record(conversation, messages, summary):
+    """The JSON document stored in the archive for one conversation."""
+    return {
+        'id': conversation.id,
+        'title': conversation.title,
+        'created_at': conversation.created_at.isoformat(),
+        'messages': [
+            {
+                'id': m.id,
+                'content': m.content,
+                'sender': m.sender,
+                'timestamp': m.timestamp.isoformat(),
+                'sentiment_score': m.sentiment_score,
+                'crisis': {'matched': m.matched, 'created_at': m.flagged_at.isoformat()} if m.matched else None,
+            }
+            for m in messages
+        ],
+        'summary': {'summary': summary.summary, 'last_message_id': summary.last_message_id} if summary else None,
+    }
+
+def archive_batch(conversation_ids):
+    """Append these conversations to their users' archives and delete them, in one transaction."""
+    conversations = (
+        Conversation.query.filter(Conversation.id.in_(conversation_ids))
+        .order_by(Conversation.user_id, Conversation.id)
+        .all()
+    )
+    messages = defaultdict(list)
+    rows = (
+        db.session.query(Message.id, Message.conversation_id, Message.content, Message.sender, Message.timestamp,
+                         Message.sentiment_score, CrisisFlag.matched, CrisisFlag.created_at.label('flagged_at'))
+        .outerjoin(CrisisFlag, CrisisFlag.message_id == Message.id)
+        .filter(Message.conversation_id.in_(conversation_ids))
+        .order_by(Message.conversation_id, Message.timestamp, Message.id)
+    )
+    for row in rows:
+        messages[row.conversation_id].append(row)
+    summaries = {
+        summary.conversation_id: summary
+        for summary in ConversationSummary.query.filter(ConversationSummary.conversation_id.in_(conversation_ids))
+    }
+
+    for user_id, user_conversations in groupby(conversations, key=lambda c: c.user_id):
+        user_conversations = list(user_conversations)
+        locations = conversation_archive.append(user_id, [
+            archive_record(c, messages[c.id], summaries.get(c.id)) for c in user_conversations
+        ])
+        db.session.bulk_insert_mappings(ArchivedConversation, [
+            {
+                'id': c.id,
+                'user_id': user_id,
+                'title': c.title,
+                'created_at': c.created_at,
+                'last_message': json.dumps(serialize_message(messages[c.id][-1])) if messages[c.id] else None,
+                'message_count': len(messages[c.id]),
+                'archive_offset': offset,
+                'archive_length': length,
+            }
+            for c, (offset, length) in zip(user_conversations, locations)
+        ])
+
+    message_ids = db.select(Message.id).where(Message.conversation_id.in_(conversation_ids))
+    db.session.execute(db.delete(CrisisFlag).where(CrisisFlag.message_id.in_(message_ids)))
+    db.session.execute(db.delete(Message).where(Message.conversation_id.in_(conversation_ids)))
+    db.session.execute(db.delete(ConversationSummary).where(ConversationSummary.conversation_id.in_(conversation_ids)))
+    db.session.execute(db.delete(Conversation).where(Conversation.id.in_(conversation_ids)))
+    db.session.commit()
+    return len(conversations)
+
+@main.cli.command('archive-conversations')
+@click.option('--older-than-days', type=int, help='Archive conversations idle this long. [default: ARCHIVE_AFTER_DAYS]')
+@click.option('--batch-size', default=100, show_default=True, help='Conversations archived per transaction.')
+@click.option('--vacuum', is_flag=True, help='VACUUM afterwards so the database file shrinks.')
+def archive_conversations(older_than_days, batch_size, vacuum):
+    """Move conversations with no recent messages into compressed per-user archive files."""
+    if older_than_days is None:
+        older_than_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    # SQLite gives new rows max(id) + 1, so archiving the newest conversation
+    # or message would let a new row reuse an id the archive still holds.
+    keep = {
+        db.session.query(func.max(Conversation.id)).scalar(),
+        db.session.query(Message.conversation_id).order_by(Message.id.desc()).limit(1).scalar(),
+    }
+    last_activity = func.coalesce(func.max(Message.timestamp), Conversation.created_at)
+    candidates = (
+        db.session.query(Conversation.id)
+        .outerjoin(Message, Message.conversation_id == Conversation.id)
+        .group_by(Conversation.id)
+        .having(last_activity < cutoff)
+        .order_by(Conversation.id)
+    )
+    conversation_ids = [conversation_id for (conversation_id,) in candidates if conversation_id not in keep]
+
+    archived = 0
+    for start in range(0, len(conversation_ids), batch_size):
+        archived += archive_batch(conversation_ids[start:start + batch_size])
+        click.echo(f"Archived {archived} of {len(conversation_ids)} conversations")
+    if vacuum:
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM')
+    click.echo(f"Done. Archived {archived} conversations.")
+
+@main.cli.command('build-assets')
+def build_static_assets():
+    """Write fingerprinted, precompressed copies of static/ to ASSETS_DIR."""
+    if not HAS_BROTLI:
+        click.echo("brotli is not installed; writing gzip variants only.")
+    manifest = build_assets(current_app.static_folder, current_app.config['ASSETS_DIR'])
+    for logical, entry in sorted(manifest['files'].items()):
+        sizes = ', '.join(f"{encoding} {size}" for encoding, size in sorted(entry['encodings'].items()))
+        click.echo(f"{logical} -> {entry['path']} ({entry['size']} bytes{'; ' + sizes if sizes else ''})")
+    click.echo("Restart the app to serve the new build.")
+
+@main.route('/api/auth/stats')
+@login_required
+def auth_stats():
+    return jsonify({
+        'password_hashing': hash_pool.stats(),
+        'login_throttled': {
+            'per_user': user_login_limiter.rejected,
+            'per_ip': ip_login_limiter.rejected,
+        },
+        'user_cache': user_cache.stats() if user_cache is not None else None,
+    })
+
+def collect_component_stats():
+    """Export the counters kept by the caches, queues and pools."""
+    stats = db_stats.snapshot()
+    yield family('mindbloom_db_statements_total', 'counter', 'SQL statements executed.', stats['statements'])
+    yield family('mindbloom_db_statement_seconds_total', 'counter', 'Time spent executing SQL statements.',
+                 stats['statement_seconds'])
+    yield family('mindbloom_db_writes_total', 'counter', 'INSERT, UPDATE and DELETE statements.', stats['writes'])
+    yield family('mindbloom_db_lock_waits_total', 'counter', 'Writes slow enough to have waited on the lock.',
+                 stats['lock_waits'])
+    yield family('mindbloom_db_lock_wait_seconds_total', 'counter', 'Time spent in writes counted as lock waits.',
+                 stats['lock_wait_seconds'])
+    yield family('mindbloom_db_lock_errors_total', 'counter', 'Statements that failed with "database is locked".',
+                 stats['lock_errors'])
+
+    if response_cache is not None:
+        stats = response_cache.stats()
+        yield family('mindbloom_response_cache_lookups_total', 'counter', 'Response cache lookups by result.',
+                     by=('result', {'hit': stats['hits'], 'near_hit': stats['near_hits'], 'miss': stats['misses']}))
+        yield family('mindbloom_response_cache_entries', 'gauge', 'Replies in the response cache.', stats['entries'])
+
+    if user_cache is not None:
+        stats = user_cache.stats()
+        yield family('mindbloom_user_cache_lookups_total', 'counter', 'Signed-in user cache lookups by result.',
+                     by=('result', {'hit': stats['hits'], 'miss': stats['misses']}))
+        yield family('mindbloom_user_cache_entries', 'gauge', 'Users in the signed-in user cache.', stats['entries'])
+
+    stats = hash_pool.stats()
+    yield ('mindbloom_password_hash_seconds', 'summary', 'Password hash and check time.', [
+        ('mindbloom_password_hash_seconds', {'quantile': '0.5'}, stats['latency_p50_seconds']),
+        ('mindbloom_password_hash_seconds', {'quantile': '0.95'}, stats['latency_p95_seconds']),
+        ('mindbloom_password_hash_seconds_sum', {}, stats['latency_mean_seconds'] * stats['hashes']),
+        ('mindbloom_password_hash_seconds_count', {}, stats['hashes']),
+    ])
+    yield family('mindbloom_password_hash_queue_depth', 'gauge', 'Hash jobs running or waiting.',
+                 stats['queue_depth'])
+    yield family('mindbloom_password_hash_rejected_total', 'counter', 'Logins refused with a full hash queue.',
+                 stats['rejected'])
+    yield family('mindbloom_login_throttled_total', 'counter', 'Login attempts refused by the rate limiter.',
+                 by=('scope', {'user': user_login_limiter.rejected, 'ip': ip_login_limiter.rejected}))
+
+    if message_writer is not None:
+        yield family('mindbloom_write_behind_rows_total', 'counter', 'Messages written by the write-behind queue.',
+                     message_writer.rows)
+        yield family('mindbloom_write_behind_batches_total', 'counter', 'Write-behind transactions committed.',
+                     message_writer.batches)
+        yield family('mindbloom_write_behind_failed_total', 'counter', 'Queued messages that could not be written.',
+                     message_writer.failed)
+
+    stats = conversation_archive.stats()
+    yield family('mindbloom_archive_reads_total', 'counter', 'Conversations read back from archive files.',
+                 stats['reads'])
+    yield family('mindbloom_archive_read_bytes_total', 'counter', 'Compressed bytes read from archive files.',
+                 stats['bytes_read'])
+
+    yield family('mindbloom_summary_queue_depth', 'gauge', 'Conversations waiting for a summary update.',
+                 summary_queue.depth())
+    yield family('mindbloom_summary_dropped_total', 'counter', 'Summary updates skipped with a full queue.',
+                 summary_queue.dropped)
+
+    if sentiment_queue is not None:
+        yield family('mindbloom_sentiment_dropped_total', 'counter', 'Messages left unscored with a full queue.',
+                     sentiment_queue.dropped)
+
+registry.add_collector(collect_component_stats)
+
+@main.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def create_app(overrides=None):
+    """Build the app from the environment; ``overrides`` replaces individual settings."""
+    app = Flask(__name__)
+    app.config.from_mapping(load_config(app.instance_path))
+    if overrides:
+        app.config.update(overrides)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.register_blueprint(main)
     with app.app_context():
+        db_stats.install(db.engine)
+        if app.config['STORAGE_MODE'] == 'production' and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+            event.listen(db.engine, 'connect', partial(set_sqlite_pragmas, app.config))
+    init_services(app)
+    return app
+
+def init_db(flask_app=None):
+    with (flask_app or app).app_context():
         db.create_all()
+        # create_all skips tables that already exist, so add any indexes
+        # introduced since the database was first created.
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        with db.engine.begin() as connection:
+            if search.fts_available(connection):
+                if search.ensure_index(connection):
+                    # A new index starts empty; populate it from existing messages.
+                    search.rebuild_index(connection)
+            else:
+                print("Warning: SQLite was built without FTS5. Message search disabled.")
         print("Database tables created successfully!")
 
+# Module-level app for `gunicorn app:app` and `flask --app app`.
+app = create_app()
+
 if __name__ == '__main__':
     init_db()
     print("Starting MindBloom Flask App on http://localhost:5000")
@@ -0,0 +1,55 @@
+"""Compressed per-user files holding conversations moved out of the database.
+
+Each user has one file, ``<user_id>.ndjson.gz``. Every archived conversation
+is appended to it as its own gzip member holding one JSON line, so the whole
+file is ordinary gzip (``zcat`` prints one conversation per line) and a single
+conversation can be read back from its offset and length without
+decompressing the rest.
+"""
+import gzip
+import json
+import os
+import threading
+
+
+class ConversationArchive:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.bytes_read = 0
+
+    def path(self, user_id):
+        return os.path.join(self.root, f'{int(user_id)}.ndjson.gz')
+
+    def append(self, user_id, records):
+        """Append conversation records and return their ``(offset, length)`` in order.
+
+        The data is fsynced before this returns. If the caller's transaction
+        then fails, the appended bytes are simply never referenced.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        locations = []
+        with open(self.path(user_id), 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            for record in records:
+                blob = gzip.compress(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+                f.write(blob)
+                locations.append((offset, len(blob)))
+                offset += len(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        return locations
+
+    def read(self, user_id, offset, length):
+        with open(self.path(user_id), 'rb') as f:
+            f.seek(offset)
+            blob = f.read(length)
+        with self._lock:
+            self.reads += 1
+            self.bytes_read += len(blob)
+        return json.loads(gzip.decompress(blob))
+
+    def stats(self):
+        with self._lock:
+            return {'reads': self.reads, 'bytes_read': self.bytes_read}
@@ -0,0 +1,114 @@
+"""Fingerprinted, precompressed copies of the static files.
+
+``build_assets`` copies every file under ``static/`` to the output directory
+with a content hash in its name (``css/style.3f9a0c1d2b4e.css``). Text files also
+get ``.gz`` and, when the brotli package is installed, ``.br`` variants. The
+logical-to-hashed mapping is written to ``manifest.json``, which
+``AssetManifest`` reads at startup. A hashed name never changes content, so
+these files can be cached for a year.
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+
+HAS_BROTLI = importlib.util.find_spec('brotli') is not None
+
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.map')
+
+# Preferred first.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def hashed_name(path, content):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def compress(content):
+    """Return ``{encoding: bytes}`` for the variants worth keeping."""
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if HAS_BROTLI:
+        import brotli
+        variants['br'] = brotli.compress(content, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def build_assets(static_dir, out_dir):
+    """Write hashed and compressed copies of ``static_dir`` into ``out_dir``.
+
+    Returns the manifest. Files from earlier builds are left in place, so
+    pages rendered before a deploy can still load the assets they name.
+    """
+    files = {}
+    skip = os.path.abspath(out_dir)
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames[:] = sorted(d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != skip)
+        for filename in sorted(filenames):
+            source = os.path.join(dirpath, filename)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                content = f.read()
+            target = hashed_name(logical, content)
+            encodings = compress(content) if logical.endswith(COMPRESSIBLE) else {}
+            os.makedirs(os.path.dirname(os.path.join(out_dir, target)), exist_ok=True)
+            shutil.copyfile(source, os.path.join(out_dir, target))
+            for encoding, suffix in ENCODINGS:
+                if encoding in encodings:
+                    with open(os.path.join(out_dir, target + suffix), 'wb') as f:
+                        f.write(encodings[encoding])
+            files[logical] = {
+                'path': target,
+                'size': len(content),
+                'encodings': {encoding: len(data) for encoding, data in encodings.items()},
+            }
+
+    manifest = {'version': hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:12],
+                'files': files}
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = os.path.join(out_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST_NAME))
+    return manifest
+
+
+class AssetManifest:
+    """Lookups into a built manifest. Without one, every lookup misses."""
+
+    def __init__(self, root, manifest=None):
+        self.root = root
+        manifest = manifest or {'version': '', 'files': {}}
+        self.version = manifest['version']
+        self.files = manifest['files']
+        self._by_path = {entry['path']: entry for entry in self.files.values()}
+
+    @classmethod
+    def load(cls, root):
+        try:
+            with open(os.path.join(root, MANIFEST_NAME)) as f:
+                return cls(root, json.load(f))
+        except FileNotFoundError:
+            return cls(root)
+
+    def hashed(self, logical):
+        """The hashed path for a static file, or None if it was not built."""
+        entry = self.files.get(logical)
+        return entry['path'] if entry else None
+
+    def variant(self, path, accepts):
+        """Return ``(file to send, Content-Encoding or None)`` for a hashed path.
+
+        ``accepts(encoding)`` says whether the client takes that encoding.
+        Returns None for paths that are not in the manifest.
+        """
+        entry = self._by_path.get(path)
+        if entry is None:
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding in entry['encodings'] and accepts(encoding):
+                return path + suffix, encoding
+        return path, None
@@ -0,0 +1,75 @@
+"""Per-message cost of the crisis detector as the phrase list grows.
+
+    python bench/crisis_bench.py --patterns 1000 5000 20000
+
+Synthetic phrases (2-4 words drawn from a generated vocabulary) are added to
+the built-in list, then a fixed set of chat-sized messages is scanned
+repeatedly. Build time and per-message latency are printed for each size.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crisis import CrisisDetector, DEFAULT_PHRASES  # noqa: E402
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "I feel anxious about my exam tomorrow and can't sleep",
+    "Work has been really stressful lately and I keep snapping at my partner, "
+    "then feeling guilty about it for the rest of the evening.",
+    "honestly I just want to die, nothing is getting better",
+    "I had a good day today! Went for a walk and called my sister.",
+    "Sometimes I think everyone would be better off dead without me around, is that weird",
+    "can you suggest a breathing exercise? my chest feels tight " * 3,
+]
+
+
+def synthetic_phrases(count, rng):
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+                  for _ in range(2000)]
+    return [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+
+def run(pattern_count, rounds, rng):
+    phrases = list(DEFAULT_PHRASES) + synthetic_phrases(pattern_count, rng)
+    started = time.perf_counter()
+    detector = CrisisDetector(phrases)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    for _ in range(rounds):
+        for message in SAMPLE_MESSAGES:
+            started = time.perf_counter()
+            detector.find(message)
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        'patterns': len(phrases),
+        'build_ms': build_ms,
+        'mean_us': statistics.fmean(timings),
+        'p50_us': timings[len(timings) // 2],
+        'p99_us': timings[int(len(timings) * 0.99)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patterns', type=int, nargs='+', default=[0, 1000, 5000, 20000])
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'patterns':>9} {'build ms':>9} {'mean us':>8} {'p50 us':>7} {'p99 us':>7}")
+    for count in args.patterns:
+        r = run(count, args.rounds, rng)
+        print(f"{r['patterns']:>9} {r['build_ms']:>9.1f} {r['mean_us']:>8.1f} {r['p50_us']:>7.1f} {r['p99_us']:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
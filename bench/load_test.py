@@ -0,0 +1,306 @@
+"""Load test for the login and chat flows against a local gunicorn.
+
+    python bench/load_test.py --users 50 --messages 5 --workers 2 --threads 16 \\
+        --stub-latency-ms 800 --output results.json --baseline previous.json
+
+The harness starts gunicorn on a throwaway SQLite database with
+MODEL_BACKEND=stub, so no Gemini calls are made. It registers the users,
+then runs login plus a run of chat messages per user at the requested
+concurrency. It reports p50/p95/p99 latency per operation, chat requests per
+second and the server's SQLite write/lock-wait counters. Any app setting can
+be passed through with --env (for example --env STORAGE_MODE=production
+--env CHAT_EXECUTION_MODE=pool), which makes it easy to compare
+configurations. Results are written as JSON; --baseline prints the change
+against an earlier results file.
+"""
+import argparse
+import glob
+import http.cookiejar
+import json
+import os
+import platform
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MESSAGES = [
+    "hi",
+    "I feel anxious about work",
+    "I can't sleep and my mind keeps racing",
+    "Can you suggest a breathing exercise?",
+    "Thanks, that helped a little",
+    "What else could I try tonight?",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, op, seconds, ok=True):
+        with self._lock:
+            if ok:
+                self.latencies[op].append(seconds)
+            else:
+                self.errors[op] += 1
+
+    def summary(self):
+        ops = sorted(set(self.latencies) | set(self.errors))
+        return {op: summarize(self.latencies[op], self.errors[op]) for op in ops}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def summarize(values, errors):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'errors': errors,
+        'mean_ms': statistics.fmean(values) * 1000 if values else None,
+        'p50_ms': percentile(values, 0.50) * 1000 if values else None,
+        'p95_ms': percentile(values, 0.95) * 1000 if values else None,
+        'p99_ms': percentile(values, 0.99) * 1000 if values else None,
+    }
+
+
+class Client:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def post_json(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        with self.opener.open(request, timeout=120) as response:
+            return json.loads(response.read())
+
+    def post_stream(self, path, payload):
+        """Return (seconds to first chunk, total seconds, conversation_id)."""
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        started = time.perf_counter()
+        first_chunk = None
+        conversation_id = None
+        done = False
+        with self.opener.open(request, timeout=120) as response:
+            for line in response:
+                if not line.startswith(b'data: '):
+                    continue
+                event = json.loads(line[6:])
+                conversation_id = event.get('conversation_id', conversation_id)
+                if event['type'] == 'chunk' and first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                done = done or event['type'] == 'done'
+        if not done:
+            raise ValueError("stream ended without a done event")
+        return first_chunk, time.perf_counter() - started, conversation_id
+
+
+def timed(recorder, op, fn, *args):
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+    except (urllib.error.URLError, OSError, ValueError):
+        recorder.record(op, 0, ok=False)
+        return None
+    recorder.record(op, time.perf_counter() - started)
+    return result
+
+
+def register_user(base_url, recorder, username):
+    client = Client(base_url)
+    result = timed(recorder, 'register', client.post_json, '/register',
+                   {'username': username, 'email': f'{username}@bench.local', 'password': 'bench-password'})
+    if not result or not result.get('success'):
+        recorder.record('register', 0, ok=False)
+
+
+def run_user(base_url, recorder, username, messages, stream):
+    client = Client(base_url)
+    result = timed(recorder, 'login', client.post_json, '/login',
+                   {'username': username, 'password': 'bench-password'})
+    if not result or not result.get('success'):
+        return
+    conversation_id = None
+    for i in range(messages):
+        payload = {'message': MESSAGES[i % len(MESSAGES)], 'conversation_id': conversation_id}
+        if stream:
+            try:
+                first_chunk, total, conversation_id = client.post_stream('/api/chat/stream', payload)
+            except (urllib.error.URLError, OSError, ValueError):
+                recorder.record('chat_stream', 0, ok=False)
+                continue
+            recorder.record('chat_stream', total)
+            if first_chunk is not None:
+                recorder.record('chat_stream_first_chunk', first_chunk)
+        else:
+            result = timed(recorder, 'chat', client.post_json, '/api/chat', payload)
+            if result:
+                conversation_id = result.get('conversation_id')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=1).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise SystemExit("gunicorn did not start in time")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange against {baseline_path}:")
+    for op, current in results['operations'].items():
+        before = baseline.get('operations', {}).get(op)
+        if not before or not before.get('p95_ms') or not current.get('p95_ms'):
+            continue
+        change = (current['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        print(f"  {op:<24} p95 {before['p95_ms']:8.1f} -> {current['p95_ms']:8.1f} ms ({change:+.1f}%)")
+    if baseline.get('chat_requests_per_second'):
+        change = (results['chat_requests_per_second'] - baseline['chat_requests_per_second']) \
+            / baseline['chat_requests_per_second'] * 100
+        print(f"  {'chat requests/sec':<24} {baseline['chat_requests_per_second']:8.1f} -> "
+              f"{results['chat_requests_per_second']:8.1f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='virtual users (one session each)')
+    parser.add_argument('--concurrency', type=int, default=None, help='users running at once (default: all)')
+    parser.add_argument('--messages', type=int, default=5, help='chat messages per user')
+    parser.add_argument('--stream', action='store_true', help='use /api/chat/stream instead of /api/chat')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker (gthread)')
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class')
+    parser.add_argument('--stub-latency-ms', type=int, default=800)
+    parser.add_argument('--stub-jitter-ms', type=int, default=200)
+    parser.add_argument('--stub-chunks', type=int, default=8)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the server; repeatable')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mindbloom-bench-')
+    stats_dir = os.path.join(workdir, 'stats')
+    os.makedirs(stats_dir)
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    env = dict(
+        os.environ,
+        MODEL_BACKEND='stub',
+        STUB_LATENCY_MS=str(args.stub_latency_ms),
+        STUB_JITTER_MS=str(args.stub_jitter_ms),
+        STUB_CHUNKS=str(args.stub_chunks),
+        STUB_ERROR_RATE=str(args.stub_error_rate),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        BENCH_STATS_DIR=stats_dir,
+        # Shared by all workers so a session works whichever one serves it.
+        SECRET_KEY='load-test-secret',
+        # Every virtual user logs in from 127.0.0.1; lift the throttles so
+        # the test measures the app rather than the rate limiter.
+        LOGIN_RATE_PER_IP='1000000',
+        LOGIN_RATE_PER_USER='1000000',
+        **extra_env,
+    )
+
+    subprocess.run([sys.executable, '-c', 'import app; app.init_db()'], cwd=REPO_ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', args.worker_class,
+         '--threads', str(args.threads), '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL)
+    # Stats files are written when the workers exit, so they are cleared
+    # here in case startup left any behind.
+    try:
+        wait_for_server(base_url, server)
+        for path in glob.glob(os.path.join(stats_dir, '*.json')):
+            os.remove(path)
+
+        recorder = Recorder()
+        usernames = [f'bench{i}_{port}' for i in range(args.users)]
+        concurrency = args.concurrency or args.users
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda name: register_user(base_url, recorder, name), usernames))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda name: run_user(base_url, recorder, name, args.messages, args.stream), usernames))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    db_totals = defaultdict(float)
+    for path in glob.glob(os.path.join(stats_dir, '*.json')):
+        with open(path) as f:
+            for key, value in json.load(f).items():
+                db_totals[key] += value
+
+    operations = recorder.summary()
+    chat_op = 'chat_stream' if args.stream else 'chat'
+    chat_count = operations.get(chat_op, {}).get('count', 0)
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'duration_seconds': elapsed,
+        'chat_requests_per_second': chat_count / elapsed if elapsed else 0.0,
+        'operations': operations,
+        'database': dict(db_totals),
+    }
+
+    print(f"{'operation':<24} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, s in operations.items():
+        def fmt(value):
+            return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+        print(f"{op:<24} {s['count']:>6} {s['errors']:>6} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])}")
+    print(f"\n{chat_count} chat requests in {elapsed:.1f}s = {results['chat_requests_per_second']:.1f} req/s")
+    if db_totals:
+        print(f"SQLite: {int(db_totals['writes'])} writes, {int(db_totals['lock_waits'])} lock waits "
+              f"({db_totals['lock_wait_seconds'] * 1000:.0f} ms), {int(db_totals['lock_errors'])} lock errors")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Cold-start cost of the app: module import and gunicorn time to first response.
+
+    python bench/startup_time.py --runs 5 --workers 4 --output startup.json
+
+Each measurement runs in a fresh interpreter. "import" is the time for
+``import app`` (create_app included), with the model set up lazily and with
+MODEL_WARMUP=1. "gunicorn" is the time from launching gunicorn until it
+serves its first page, with and without --preload. A placeholder
+GEMINI_API_KEY is set so the Gemini client is really imported when warmed
+up; no request ever reaches the model.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import app; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def bench_env(workdir, **extra):
+    return dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        SECRET_KEY='startup-bench',
+        GEMINI_API_KEY='startup-bench-placeholder',
+        **extra,
+    )
+
+
+def time_import(env, runs):
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=REPO_ROOT, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        timings.append(float(out.strip().splitlines()[-1]))
+    return timings
+
+
+def time_interpreter(runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_gunicorn(env, workers, preload, timeout=60):
+    """Seconds from launching gunicorn until it serves its first /login."""
+    port = free_port()
+    args = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', '4',
+            '-b', f'127.0.0.1:{port}', '--log-level', 'warning']
+    if preload:
+        args.append('--preload')
+    started = time.perf_counter()
+    server = subprocess.Popen(args + ['app:app'], cwd=REPO_ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise SystemExit("gunicorn exited during startup")
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).read()
+                return time.perf_counter() - started
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.01)
+        raise SystemExit("gunicorn did not start in time")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def summarize(timings):
+    return {'median_s': statistics.median(timings), 'min_s': min(timings), 'runs': len(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--output', help='write results JSON here')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mindbloom-startup-')
+    results = {'interpreter': summarize(time_interpreter(args.runs))}
+    for name, extra in (('lazy', {}), ('warmup', {'MODEL_WARMUP': '1'})):
+        results[f'import_{name}'] = summarize(time_import(bench_env(workdir, **extra), args.runs))
+
+    for name, extra in (('lazy', {}), ('warmup', {'MODEL_WARMUP': '1'})):
+        for preload in (False, True):
+            timings = [time_gunicorn(bench_env(workdir, **extra), args.workers, preload)
+                       for _ in range(args.runs)]
+            results[f"gunicorn_{name}{'_preload' if preload else ''}"] = summarize(timings)
+
+    print(f"{'measurement':<28} {'median s':>9} {'min s':>7}")
+    for key, value in results.items():
+        print(f"{key:<28} {value['median_s']:>9.3f} {value['min_s']:>7.3f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'workers': args.workers, **results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Behavior checks for the crisis detector's built-in phrase list.
+
+    python -m pytest bench/test_crisis.py    (or: python bench/test_crisis.py)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crisis import CrisisDetector, load_phrases  # noqa: E402
+
+detector = CrisisDetector()
+
+DEFINITE = [
+    "I want to kill myself",
+    "I overdosed last night",
+    "thinking about overdosing",
+    "I keep thinking about hanging myself",
+    "I almost killed myself",
+    "been cutting myself again",
+    "i wanna dieee",
+    "thinking about sucide",
+    "I want to unalive myself",
+    "everyone would be better off dead without me",
+]
+
+SOFT = [
+    "I'm going to jump off the diving board",
+    "there's no way out of this traffic",
+    "I just want to end it all",
+    "I can't go on like this",
+]
+
+HARMLESS = [
+    "hi",
+    "I feel anxious about my exam",
+    "this is a killer playlist",
+    "the sunset was dead beautiful",
+    "I ended up hanging out with friends",
+    "I ran 10 kms this morning",
+]
+
+
+def test_definite_phrases_get_the_crisis_response():
+    for message in DEFINITE:
+        matches = detector.find(message)
+        assert matches, message
+        assert not detector.resources_only(matches), message
+
+
+def test_ambiguous_phrases_only_attach_resources():
+    for message in SOFT:
+        matches = detector.find(message)
+        assert matches, message
+        assert detector.resources_only(matches), message
+
+
+def test_ordinary_messages_do_not_match():
+    for message in HARMLESS:
+        assert detector.find(message) == [], message
+
+
+def test_a_definite_match_wins_over_a_soft_one():
+    assert not detector.resources_only(detector.find("no way out, I want to die"))
+
+
+def test_phrase_file_marks_soft_lines(tmp_path):
+    path = tmp_path / 'phrases.txt'
+    path.write_text("# comment\nkill myself\n~ no way out\n\n")
+    phrases, soft_phrases = load_phrases(path)
+    assert phrases == ['kill myself']
+    assert soft_phrases == ['no way out']
+
+
+if __name__ == '__main__':
+    import tempfile
+    import pathlib
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            if 'tmp_path' in test.__code__.co_varnames[:test.__code__.co_argcount]:
+                with tempfile.TemporaryDirectory() as tmp:
+                    test(pathlib.Path(tmp))
+            else:
+                test()
+            print(f"ok  {name}")
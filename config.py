@@ -0,0 +1,116 @@
+"""Settings read from the environment (or ``.env``) by ``create_app``."""
+import os
+import secrets
+import time
+
+from dotenv import load_dotenv
+
+GEMINI_KEY_PLACEHOLDER = 'YOUR_GEMINI_API_KEY_HERE'
+
+
+def load_secret_key(instance_path):
+    """Return SECRET_KEY from the environment, or one persisted in the instance folder.
+
+    Every worker process must sign sessions with the same key. Without
+    SECRET_KEY set, the first process to start writes a random key to
+    ``instance/secret_key`` and the others (and later restarts) read it back.
+    Servers on different machines need SECRET_KEY set to one shared value.
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    path = os.path.join(instance_path, 'secret_key')
+    os.makedirs(instance_path, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    # A process that lost the race to create the file may get here before the
+    # winner has written it.
+    for _ in range(50):
+        with open(path) as f:
+            key = f.read().strip()
+        if key:
+            return key
+        time.sleep(0.01)
+    raise RuntimeError(f"{path} is empty; delete it or set SECRET_KEY")
+
+
+def load_config(instance_path):
+    load_dotenv()
+    env = os.environ.get
+    gemini_key = env('GEMINI_API_KEY', '')
+    return {
+        'SECRET_KEY': load_secret_key(instance_path),
+        'SQLALCHEMY_DATABASE_URI': env('DATABASE_URL', 'sqlite:///mindbloom.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'GEMINI_API_KEY': '' if gemini_key == GEMINI_KEY_PLACEHOLDER else gemini_key,
+        # Build the model client during startup instead of on the first chat.
+        # With gunicorn --preload this happens once, before workers fork.
+        'MODEL_WARMUP': env('MODEL_WARMUP', '0') == '1',
+        # 'production' applies WAL and the tuning pragmas below to every SQLite connection.
+        'STORAGE_MODE': env('STORAGE_MODE', 'default'),
+        'SQLITE_BUSY_TIMEOUT_MS': int(env('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'SQLITE_CACHE_SIZE_KB': int(env('SQLITE_CACHE_SIZE_KB', 20000)),
+        'SQLITE_SYNCHRONOUS': env('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        # Group-commit chat messages from many requests in one background transaction.
+        'MESSAGE_WRITE_BEHIND': env('MESSAGE_WRITE_BEHIND', '0') == '1',
+        'WRITE_BEHIND_INTERVAL': float(env('WRITE_BEHIND_INTERVAL', 0.05)),
+        'WRITE_BEHIND_MAX_BATCH': int(env('WRITE_BEHIND_MAX_BATCH', 256)),
+        # 'inline' calls Gemini on the request thread; 'pool' commits the user message
+        # first and runs the call on a bounded thread pool with a timeout.
+        'CHAT_EXECUTION_MODE': env('CHAT_EXECUTION_MODE', 'inline'),
+        'LLM_MAX_CONCURRENCY': int(env('LLM_MAX_CONCURRENCY', 8)),
+        'LLM_MAX_PENDING': int(env('LLM_MAX_PENDING', 16)),
+        'LLM_TIMEOUT': float(env('LLM_TIMEOUT', 30)),
+        # Earlier turns sent with each prompt; older turns are folded into a summary.
+        'CONTEXT_TOKEN_BUDGET': int(env('CONTEXT_TOKEN_BUDGET', 1500)),
+        'CONTEXT_SUMMARY_TOKENS': int(env('CONTEXT_SUMMARY_TOKENS', 300)),
+        'CONTEXT_MAX_MESSAGES': int(env('CONTEXT_MAX_MESSAGES', 40)),
+        'CONTEXT_FOLD_BATCH': int(env('CONTEXT_FOLD_BATCH', 40)),
+        # Summary folds run on these background threads after the reply is sent.
+        'SUMMARY_WORKERS': int(env('SUMMARY_WORKERS', 2)),
+        'SUMMARY_MAX_PENDING': int(env('SUMMARY_MAX_PENDING', 256)),
+        # Reply cache for conversation openers: 'off', 'memory' or 'sqlite'.
+        'RESPONSE_CACHE': env('RESPONSE_CACHE', 'off'),
+        'RESPONSE_CACHE_TTL': int(env('RESPONSE_CACHE_TTL', 3600)),
+        'RESPONSE_CACHE_MAX_ENTRIES': int(env('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+        'RESPONSE_CACHE_PATH': env('RESPONSE_CACHE_PATH', os.path.join(instance_path, 'response_cache.db')),
+        # Background sentiment scoring of new messages: 'queue' or 'off'.
+        'SENTIMENT_SCORING': env('SENTIMENT_SCORING', 'queue'),
+        'SENTIMENT_BATCH_SIZE': int(env('SENTIMENT_BATCH_SIZE', 64)),
+        'SENTIMENT_FLUSH_INTERVAL': float(env('SENTIMENT_FLUSH_INTERVAL', 2)),
+        # Password hashing runs on a process pool; 0 workers hashes inline.
+        'PASSWORD_HASH_WORKERS': int(env('PASSWORD_HASH_WORKERS', 2)),
+        'PASSWORD_HASH_QUEUE': int(env('PASSWORD_HASH_QUEUE', 16)),
+        'PASSWORD_HASH_TIMEOUT': float(env('PASSWORD_HASH_TIMEOUT', 5)),
+        # Login attempts allowed per minute (burst size) for each username and each IP.
+        'LOGIN_RATE_PER_USER': int(env('LOGIN_RATE_PER_USER', 5)),
+        'LOGIN_RATE_PER_IP': int(env('LOGIN_RATE_PER_IP', 30)),
+        # Users loaded for authenticated requests are cached per process; 0 disables it.
+        'USER_CACHE_TTL': int(env('USER_CACHE_TTL', 60)),
+        'USER_CACHE_MAX_ENTRIES': int(env('USER_CACHE_MAX_ENTRIES', 10000)),
+        # Crisis phrases: one per line in CRISIS_PHRASES_FILE, or the built-in list.
+        # 'short_circuit' answers matches with crisis resources and skips Gemini;
+        # 'parallel' sends the resources and still returns the Gemini reply.
+        'CRISIS_PHRASES_FILE': env('CRISIS_PHRASES_FILE'),
+        'CRISIS_MODE': env('CRISIS_MODE', 'short_circuit'),
+        # 'gemini' or 'stub' (local fake with the latency/error knobs below, for load tests).
+        'MODEL_BACKEND': env('MODEL_BACKEND', 'gemini'),
+        'STUB_LATENCY_MS': int(env('STUB_LATENCY_MS', 800)),
+        'STUB_JITTER_MS': int(env('STUB_JITTER_MS', 200)),
+        'STUB_CHUNKS': int(env('STUB_CHUNKS', 8)),
+        'STUB_ERROR_RATE': float(env('STUB_ERROR_RATE', 0)),
+        # Output of `flask build-assets`; served from /assets/ once a manifest exists.
+        'ASSETS_DIR': env('ASSETS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist')),
+        # archive-conversations moves conversations idle this long into per-user files here.
+        'ARCHIVE_AFTER_DAYS': int(env('ARCHIVE_AFTER_DAYS', 365)),
+        'ARCHIVE_DIR': env('ARCHIVE_DIR', os.path.join(instance_path, 'archive')),
+        # Log requests slower than this with their per-phase breakdown; 0 turns the log off.
+        'SLOW_REQUEST_MS': int(env('SLOW_REQUEST_MS', 0)),
+        # When set, /metrics requires "Authorization: Bearer <token>".
+        'METRICS_TOKEN': env('METRICS_TOKEN', ''),
+    }
@@ -0,0 +1,141 @@
+"""Crisis phrase detection that runs before any model call.
+
+Phrases are compiled once into an Aho-Corasick automaton, so scanning a
+message costs one pass over its characters however many phrases are loaded.
+Text and phrases go through the same normalization: lowercase, punctuation
+to spaces, runs of a repeated letter collapsed to one ("killl" and "kill"
+both become "kil"), known misspellings replaced word by word, and a light
+suffix strip so "overdosed", "hanging" and "killed" match "overdose",
+"hang" and "kill". Matches only count on word boundaries.
+
+Soft phrases ("no way out", "jump off") are too ambiguous to answer on
+their own. A message that matches only soft phrases still gets the crisis
+resources, but the model replies as usual.
+"""
+import re
+from collections import deque
+
+# Inflected forms ("killing myself", "overdosed") are covered by the suffix strip.
+DEFAULT_PHRASES = (
+    'suicide', 'suicidal', 'kill myself', 'end my life', 'take my own life', 'want to die',
+    'wanna die', 'wish i was dead', 'wish i were dead', 'better off dead', 'no reason to live',
+    'not worth living', 'dont want to live', 'dont want to be alive', 'hurt myself',
+    'harm myself', 'self harm', 'cut myself', 'overdose', 'hang myself', 'goodbye forever',
+)
+
+DEFAULT_SOFT_PHRASES = ('jump off', 'end it all', 'cant go on', 'no way out')
+
+# No "kms": it is far more often kilometres than "kill myself".
+DEFAULT_MISSPELLINGS = {
+    'sucide': 'suicide', 'suicde': 'suicide', 'suiside': 'suicide', 'suicid': 'suicide',
+    'sucidal': 'suicidal', 'suicdal': 'suicidal', 'suisidal': 'suicidal',
+    'myslef': 'myself', 'mysef': 'myself', 'selfharm': 'self harm',
+    'unalive': 'kill', 'overdoze': 'overdose', 'wana': 'wanna', 'dnt': 'dont', 'cnt': 'cant',
+}
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_REPEATS = re.compile(r"([a-z])\1+")
+_SUFFIXES = ('ing', 'ed', 'es', 's', 'e')
+
+
+def _stem(word):
+    if not word.endswith(_SUFFIXES):
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+class CrisisDetector:
+    def __init__(self, phrases=DEFAULT_PHRASES, misspellings=None, soft_phrases=DEFAULT_SOFT_PHRASES):
+        misspellings = DEFAULT_MISSPELLINGS if misspellings is None else misspellings
+        # Misspelling keys and values are normalized the same way as text, and
+        # keys are looked up by stem, so "unalived" is caught by "unalive".
+        self.misspellings = {
+            _stem(self._squash(k)): ' '.join(map(_stem, self._squash(v).split())) for k, v in misspellings.items()
+        }
+        self.phrases = []
+        self.soft_phrases = set()
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        keys = set()
+        for phrase, soft in [(p, False) for p in phrases] + [(p, True) for p in soft_phrases]:
+            key = self.normalize(phrase)
+            if key and key not in keys:
+                keys.add(key)
+                self._add(' ' + key + ' ', phrase)
+                if soft:
+                    self.soft_phrases.add(phrase)
+        self._build_failure_links()
+
+    @staticmethod
+    def _squash(text):
+        return _REPEATS.sub(r'\1', _NON_WORD.sub(' ', text.lower().replace("'", ''))).strip()
+
+    def normalize(self, text):
+        misspellings = self.misspellings
+        return ' '.join(misspellings.get(stem, stem) for stem in map(_stem, self._squash(text).split()))
+
+    def _add(self, key, phrase):
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(phrase)
+        self.phrases.append(phrase)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find(self, text):
+        """Return the configured phrases found in ``text``, in order of appearance."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for char in ' ' + self.normalize(text) + ' ':
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.extend(phrase for phrase in out[state] if phrase not in found)
+        return found
+
+    def resources_only(self, matches):
+        """True when every match is a soft phrase, so the model should still reply."""
+        return all(phrase in self.soft_phrases for phrase in matches)
+
+
+def load_phrases(path):
+    """Read one phrase per line, ignoring blank lines and ``#`` comments.
+
+    Returns ``(phrases, soft_phrases)``; a line starting with ``~`` is soft.
+    """
+    phrases, soft_phrases = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('~'):
+                soft_phrases.append(line[1:].strip())
+            else:
+                phrases.append(line)
+    return phrases, soft_phrases
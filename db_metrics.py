@@ -0,0 +1,94 @@
+"""Statement timing and SQLite lock accounting for a SQLAlchemy engine."""
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLAC')
+
+
+class DBStats:
+    """Process-wide counters fed by engine events.
+
+    With a busy_timeout set, SQLite waits for the write lock inside the first
+    write statement of a transaction. Writes slower than
+    ``slow_write_seconds`` are therefore counted as lock waits. Writes that
+    gave up with "database is locked" are counted separately.
+
+    ``begin_request``/``end_request`` also tally the statements run by the
+    calling thread in between, which gives per-request query counts.
+    """
+
+    def __init__(self, slow_write_seconds=0.05):
+        self.slow_write_seconds = slow_write_seconds
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.statement_seconds = 0.0
+        self.writes = 0
+        self.write_seconds = 0.0
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self.lock_errors = 0
+        self._local = threading.local()
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        event.listen(engine, 'handle_error', self._error)
+
+    def begin_request(self):
+        self._local.tally = [0, 0.0]
+
+    def end_request(self):
+        """Return ``(statements, seconds)`` since ``begin_request`` on this thread."""
+        tally = getattr(self._local, 'tally', None)
+        self._local.tally = None
+        return tuple(tally) if tally else (0, 0.0)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+        is_write = statement.lstrip()[:6].upper() in WRITE_VERBS
+        tally = getattr(self._local, 'tally', None)
+        if tally is not None:
+            tally[0] += 1
+            tally[1] += elapsed
+        with self._lock:
+            self.statements += 1
+            self.statement_seconds += elapsed
+            if is_write:
+                self.writes += 1
+                self.write_seconds += elapsed
+                if elapsed >= self.slow_write_seconds:
+                    self.lock_waits += 1
+                    self.lock_wait_seconds += elapsed
+
+    def _error(self, context):
+        started = context.connection.info.get('statement_started') if context.connection is not None else None
+        if started:
+            started.pop()
+        if 'database is locked' in str(context.original_exception):
+            with self._lock:
+                self.lock_errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'statements': self.statements,
+                'statement_seconds': self.statement_seconds,
+                'writes': self.writes,
+                'write_seconds': self.write_seconds,
+                'lock_waits': self.lock_waits,
+                'lock_wait_seconds': self.lock_wait_seconds,
+                'lock_errors': self.lock_errors,
+            }
+
+    def dump(self, directory):
+        """Write this process's counters to ``directory`` (used by bench/load_test.py)."""
+        path = os.path.join(directory, f"db-stats-{os.getpid()}.json")
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f)
@@ -0,0 +1,106 @@
+"""Password hashing off the request thread.
+
+PBKDF2 is deliberately slow and holds the GIL while it runs, so hashing
+inline stalls every other request on the same worker. HashPool runs
+werkzeug's hash functions in a small process pool. A bounded number of jobs
+may be in flight at once, and callers beyond that are turned away instead of
+queueing behind a login storm.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class HashPool:
+    def __init__(self, workers=2, max_queue=16, timeout=5.0):
+        self.workers = workers
+        self.timeout = timeout
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=1024)
+        self._count = 0
+        self._total = 0.0
+
+    def _pool(self):
+        # Created on first use so the processes belong to the worker that uses
+        # them, not to a preloading parent. By then the worker is running
+        # request, LLM pool and queue threads, and forking it could copy a
+        # held lock into a child, so the children come from a fork server
+        # (spawn where there is none). They only need werkzeug.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _run(self, fn, *args):
+        if self._slots is None:
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._record(time.perf_counter() - started)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+        started = time.perf_counter()
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_flight += 1
+        # The slot is held until the job really finishes, even if the caller
+        # gave up waiting, so timed-out hashes still count against the cap.
+        future.add_done_callback(lambda _: self._finished(started))
+        return future.result(timeout=self.timeout)
+
+    def _finished(self, started):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        self._record(time.perf_counter() - started)
+
+    def _record(self, elapsed):
+        with self._lock:
+            self._count += 1
+            self._total += elapsed
+            self._latencies.append(elapsed)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def generate(self, password):
+        return self._run(generate_password_hash, password)
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._latencies)
+            count, total, in_flight = self._count, self._total, self._in_flight
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(len(recent) * p))] if recent else 0.0
+
+        return {
+            'workers': self.workers,
+            'queue_depth': in_flight,
+            'rejected': self.rejected,
+            'hashes': count,
+            'latency_mean_seconds': total / count if count else 0.0,
+            'latency_p50_seconds': percentile(0.50),
+            'latency_p95_seconds': percentile(0.95),
+        }
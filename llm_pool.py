@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class LLMPoolBusy(Exception):
+    """Raised when every worker slot and queue slot is already taken."""
+
+
+class LLMPool:
+    """Bounded thread pool for blocking model calls.
+
+    At most ``max_workers`` calls run at once and at most ``max_pending`` more
+    may wait for a worker; anything beyond that is rejected immediately instead
+    of piling up behind a slow upstream.
+    """
+
+    def __init__(self, max_workers=8, max_pending=16, timeout=30.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise LLMPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the call really finishes, even if the caller
+        # gave up waiting, so timed-out calls still count against the cap.
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run ``fn`` on the pool and wait for its result.
+
+        Raises ``LLMPoolBusy`` when the pool is saturated and
+        ``concurrent.futures.TimeoutError`` when the call does not finish in
+        time.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stream(self, fn, *args, timeout=None, max_buffered=64, **kwargs):
+        """Run the generator function ``fn`` on the pool and return an iterator over its items.
+
+        A worker feeds a bounded queue that the caller drains. Raises
+        ``LLMPoolBusy`` straight away when the pool is saturated; iterating
+        raises ``concurrent.futures.TimeoutError`` once ``timeout`` seconds
+        have passed since this call. Closing the iterator early stops the
+        worker at its next item.
+        """
+        items = queue.Queue(maxsize=max_buffered)
+        stop = threading.Event()
+
+        def offer(item):
+            while not stop.is_set():
+                try:
+                    items.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            generator = fn(*args, **kwargs)
+            try:
+                for item in generator:
+                    if not offer(item):
+                        return
+                offer(_DONE)
+            except Exception as e:
+                offer(_Failure(e))
+            finally:
+                generator.close()
+
+        future = self.submit(produce)
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        def consume():
+            try:
+                while True:
+                    try:
+                        item = items.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        raise FutureTimeoutError() from None
+                    if item is _DONE:
+                        return
+                    if isinstance(item, _Failure):
+                        raise item.error
+                    yield item
+            finally:
+                stop.set()
+                future.cancel()
+
+        return consume()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,65 @@
+"""Model backends usable as ``TherapyBot.model``.
+
+Anything with a ``generate_content(prompt, stream=False)`` method that returns
+an object with ``.text`` (or an iterable of such chunks when streaming) can
+stand in for ``google.generativeai.GenerativeModel``.
+"""
+import random
+import time
+
+STUB_REPLY = (
+    "Thank you for sharing that with me. It sounds like a lot to carry right now, and it makes sense "
+    "that you feel this way. Let's take one slow breath together. What feels most important to talk "
+    "about next?"
+)
+
+
+class StubError(RuntimeError):
+    """Injected failure, standing in for a Gemini API error."""
+
+
+class StubChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Local stand-in for Gemini with tunable latency, jitter and failures.
+
+    A reply takes ``latency_ms`` plus or minus up to ``jitter_ms``; streamed
+    replies spread that time evenly across ``chunks`` pieces. ``error_rate``
+    is the probability that a call raises ``StubError``.
+    """
+
+    def __init__(self, latency_ms=800, jitter_ms=200, chunks=8, error_rate=0.0, reply=STUB_REPLY, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.reply = reply
+        self._random = random.Random(seed)
+
+    def _delay(self):
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _maybe_fail(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise StubError("stub model: injected failure")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            return self._stream(self._delay())
+        time.sleep(self._delay())
+        self._maybe_fail()
+        return StubChunk(self.reply)
+
+    def _stream(self, delay):
+        words = self.reply.split(' ')
+        size = -(-len(words) // self.chunks)
+        pieces = [' '.join(words[i:i + size]) + ' ' for i in range(0, len(words), size)]
+        pieces[-1] = pieces[-1].rstrip()
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            self._maybe_fail()
+            yield StubChunk(piece)
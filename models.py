@@ -0,0 +1,83 @@
+"""Database models. ``db`` is bound to an app by ``create_app``."""
+from datetime import datetime
+
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
+    mood_entries = db.relationship('MoodEntry', backref='user', lazy=True, cascade='all, delete-orphan')
+
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(200), default='New Conversation')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (db.Index('ix_conversation_user_created', 'user_id', 'created_at', 'id'),)
+
+class Message(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    sender = db.Column(db.String(10), nullable=False)  # 'user' or 'bot'
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    sentiment_score = db.Column(db.Float, default=0.0)
+
+    __table_args__ = (db.Index('ix_message_conversation_timestamp', 'conversation_id', 'timestamp', 'id'),)
+
+class ArchivedConversation(db.Model):
+    """A conversation moved to its user's archive file; the messages live only there."""
+    id = db.Column(db.Integer, primary_key=True)  # the original conversation id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_message = db.Column(db.Text)  # JSON, so listings never open the archive
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    archive_offset = db.Column(db.Integer, nullable=False)
+    archive_length = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_archived_conversation_user_created', 'user_id', 'created_at', 'id'),)
+
+class CrisisFlag(db.Model):
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id'), primary_key=True)
+    matched = db.Column(db.Text, nullable=False)  # matched phrases, comma separated
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    message = db.relationship(
+        'Message', backref=db.backref('crisis_flag', uselist=False, cascade='all, delete-orphan'))
+
+class ConversationSummary(db.Model):
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=False, default='')
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)  # newest message folded in
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class JobCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MoodEntry(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    mood = db.Column(db.String(20), nullable=False)
+    intensity = db.Column(db.Integer, default=5)
+    notes = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MoodDailyRollup(db.Model):
+    """Per-user, per-day, per-mood totals kept in step with MoodEntry inserts."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    mood = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    intensity_sum = db.Column(db.Integer, nullable=False, default=0)
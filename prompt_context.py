@@ -0,0 +1,70 @@
+"""Prompt assembly for multi-turn conversations.
+
+Recent turns are included verbatim up to a token budget; anything older is
+represented by a rolling per-conversation summary. Everything here works on
+plain ``(sender, content)`` pairs so it stays independent of the models.
+"""
+
+SPEAKERS = {'user': 'User', 'bot': 'AI'}
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; close enough for
+    # budgeting without pulling in a tokenizer.
+    return len(text) // 4 + 1
+
+
+def format_turn(sender, content):
+    return f"{SPEAKERS.get(sender, sender)}: {content}"
+
+
+def split_by_budget(turns, budget):
+    """Split oldest-first ``turns`` into ``(older, recent)``.
+
+    ``recent`` is the longest suffix of ``turns`` whose estimated size fits in
+    ``budget`` tokens.
+    """
+    used = 0
+    cut = len(turns)
+    for index in range(len(turns) - 1, -1, -1):
+        used += estimate_tokens(format_turn(*turns[index]))
+        if used > budget:
+            break
+        cut = index
+    return turns[:cut], turns[cut:]
+
+
+def render_prompt(system, user_message, summary=None, turns=()):
+    parts = [system]
+    if summary:
+        parts.append("Summary of the earlier conversation: " + summary)
+    parts.extend(format_turn(sender, content) for sender, content in turns)
+    parts.append("User: " + user_message)
+    return "\n".join(parts) + "\nAI:"
+
+
+def summary_prompt(previous_summary, turns, max_tokens):
+    lines = [
+        "Update the running summary of a supportive conversation between a user and MindBloom.",
+        f"Keep it under {max_tokens * 3 // 4} words. Preserve the user's feelings, concerns "
+        "and anything they asked MindBloom to remember.",
+        "",
+        "Current summary: " + (previous_summary or "(none)"),
+        "",
+        "New turns:",
+    ]
+    lines.extend(format_turn(sender, content) for sender, content in turns)
+    lines.append("")
+    lines.append("Updated summary:")
+    return "\n".join(lines)
+
+
+def fallback_summary(previous_summary, turns, max_tokens):
+    """Cheap extractive summary used when the model is unavailable."""
+    lines = [previous_summary] if previous_summary else []
+    for sender, content in turns:
+        if sender == 'user':
+            lines.append("The user said: " + content[:200])
+    summary = " ".join(lines)
+    max_chars = max_tokens * 4
+    return summary[-max_chars:] if len(summary) > max_chars else summary
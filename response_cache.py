@@ -0,0 +1,191 @@
+"""Cache of model replies for short conversation openers.
+
+Entries are looked up twice: first by the normalized message text, then by a
+coarser feature key (content words in order with filler removed, crude
+stemming and squashed letter repeats) so that "hiii", "Hi!" and "hi there" or
+"I feel anxious" and "feeling anxious" share a reply. The feature key is only
+used for short openers: a longer message can differ in ways the key cannot
+see ("not sad, happy" against "not happy, sad"), so it only hits on its exact
+text. Both keys include a version string so changing the system instruction
+invalidates old replies.
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_REPEATS = re.compile(r"(\w)\1{2,}")
+
+FILLER_WORDS = frozenset({
+    'a', 'am', 'an', 'and', 'are', 'been', 'but', 'i', 'im', 'is', 'it', 'just', 'me',
+    'my', 'now', 'really', 'right', 'so', 'the', 'there', 'today', 'very', 'was', 'hey',
+    'hello', 'hi', 'hii', 'yo',
+})
+GREETING_WORDS = frozenset({'hey', 'hello', 'hi', 'hii', 'yo'})
+
+# Messages with more content words than this get no feature key.
+MAX_FEATURE_WORDS = 2
+
+
+def normalize(text):
+    text = _PUNCTUATION.sub('', text.lower().replace("'", ''))
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _stem(word):
+    for suffix in ('ing', 'ed', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def feature_key(normalized):
+    """The near-duplicate key for a short opener, or None if it should only match exactly."""
+    words = [_stem(_REPEATS.sub(r'\1', word)) for word in normalized.split()]
+    content = [word for i, word in enumerate(words) if word not in FILLER_WORDS and word not in words[:i]]
+    if not content:
+        # Only a real greeting shares the greeting reply; "it is" does not.
+        return '<greeting>' if GREETING_WORDS.intersection(words) else None
+    if len(content) > MAX_FEATURE_WORDS:
+        return None
+    return ' '.join(content)
+
+
+class MemoryBackend:
+    """In-process LRU with a TTL. Each worker process keeps its own copy."""
+
+    def __init__(self, max_entries=1000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """LRU with a TTL in a SQLite table, shared by every worker on the host."""
+
+    def __init__(self, path, max_entries=10000, ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_used_at ON response_cache (used_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT value, stored_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend, version, max_message_chars=200):
+        self.backend = backend
+        self.version = version
+        self.max_message_chars = max_message_chars
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _keys(self, message):
+        normalized = normalize(message)
+        keys = [f"{self.version}:x:{normalized}"]
+        near = feature_key(normalized)
+        if near is not None:
+            keys.append(f"{self.version}:n:{near}")
+        return keys
+
+    def cacheable(self, message):
+        return len(message) <= self.max_message_chars
+
+    def get(self, message):
+        keys = self._keys(message)
+        value = self.backend.get(keys[0])
+        if value is not None:
+            self.hits += 1
+            return value
+        value = self.backend.get(keys[1]) if len(keys) > 1 else None
+        if value is not None:
+            self.near_hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, message, response):
+        for key in self._keys(message):
+            self.backend.set(key, response)
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            'hits': self.hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            'entries': len(self.backend),
+        }
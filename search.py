@@ -0,0 +1,118 @@
+"""Full-text search over chat messages with SQLite FTS5.
+
+``message_fts`` is an external-content index over the
+``message_search_source`` view, which pairs each message's text with an
+``owner`` token (``u<user_id>``). Queries always include the owner token, so
+FTS5 intersects the user's posting list with the search terms instead of
+matching every user's messages and filtering afterwards. Triggers on
+``message`` keep the index in step with inserts, deletes and edits.
+"""
+import html
+import re
+
+from sqlalchemy import DateTime, text
+from sqlalchemy.exc import OperationalError
+
+SCHEMA = [
+    """
+    CREATE VIEW IF NOT EXISTS message_search_source AS
+    SELECT m.id AS id, m.content AS content, 'u' || c.user_id AS owner
+    FROM message m JOIN conversation c ON c.id = m.conversation_id
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        content, owner,
+        content='message_search_source', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ai AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversation WHERE id = new.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_ad AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversation WHERE id = old.conversation_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS message_fts_au AFTER UPDATE OF content ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, content, owner)
+        SELECT 'delete', old.id, old.content, 'u' || user_id FROM conversation WHERE id = old.conversation_id;
+        INSERT INTO message_fts(rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM conversation WHERE id = new.conversation_id;
+    END
+    """,
+]
+
+# snippet() marks matches with private-use characters. Message text is
+# escaped first, and only then are the markers turned into <mark> tags.
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+SEARCH_SQL = text("""
+    SELECT m.id, m.conversation_id, c.title, m.sender, m.timestamp,
+           snippet(message_fts, 0, :match_start, :match_end, '…', 12) AS snippet,
+           bm25(message_fts, 1.0, 0.0) AS rank
+    FROM message_fts
+    JOIN message m ON m.id = message_fts.rowid
+    JOIN conversation c ON c.id = m.conversation_id
+    WHERE message_fts MATCH :match
+    ORDER BY rank
+    LIMIT :limit
+""").columns(timestamp=DateTime)
+
+_TERMS = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchUnavailable(Exception):
+    """The message index is missing: init_db has not run, or SQLite lacks FTS5."""
+
+
+def fts_available(connection):
+    return bool(connection.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def ensure_index(connection):
+    """Create the index objects; return True if the index was newly created."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_fts'")).first()
+    for statement in SCHEMA:
+        connection.execute(text(statement))
+    return exists is None
+
+
+def rebuild_index(connection):
+    connection.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
+
+
+def build_match(user_id, query):
+    """Turn free text into an FTS5 expression scoped to one user, or None."""
+    terms = _TERMS.findall(query)
+    if not terms:
+        return None
+    # Quote every term so user input can never be parsed as FTS5 syntax, and
+    # prefix-match the last one for search-as-you-type.
+    phrase = ' '.join(f'"{term}"' for term in terms) + '*'
+    return f'owner:"u{int(user_id)}" AND content:({phrase})'
+
+
+def search_messages(session, user_id, query, limit=20):
+    match = build_match(user_id, query)
+    if match is None:
+        return []
+    params = {'match': match, 'limit': limit, 'match_start': MATCH_START, 'match_end': MATCH_END}
+    try:
+        return session.execute(SEARCH_SQL, params).mappings().all()
+    except OperationalError as e:
+        if 'message_fts' in str(e.orig) or 'fts5' in str(e.orig):
+            raise SearchUnavailable(str(e.orig)) from e
+        raise
+
+
+def snippet_html(snippet):
+    """HTML-escape a snippet and wrap its matches in <mark>."""
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
@@ -0,0 +1,87 @@
+"""Sentiment scoring for chat messages, kept off the request path."""
+import atexit
+import importlib.util
+import queue
+import threading
+import time
+
+# textblob (and nltk behind it) is imported by score_texts on first use, so
+# it is not loaded at app startup.
+HAS_TEXTBLOB = importlib.util.find_spec('textblob') is not None
+
+
+def score_texts(texts):
+    """Return a polarity in [-1, 1] for each text.
+
+    Module-level so it can be shipped to a process pool.
+    """
+    from textblob import TextBlob
+    return [round(TextBlob(text).sentiment.polarity, 4) for text in texts]
+
+
+class SentimentQueue:
+    """Collects new messages and scores them in batches on a daemon thread.
+
+    ``write`` receives a list of ``(message_id, score)`` pairs and is expected
+    to persist them in a single transaction. The thread is started on first
+    use so it is created in the worker process rather than a preloading
+    parent.
+    """
+
+    def __init__(self, write, batch_size=64, interval=2.0, max_size=10000):
+        self.write = write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, message_id, text):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((message_id, text))
+        except queue.Full:
+            # The backfill command can score anything dropped here.
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sentiment', daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score_and_write(batch)
+
+    def _score_and_write(self, batch):
+        try:
+            scores = score_texts([text for _, text in batch])
+            self.write([(message_id, score) for (message_id, _), score in zip(batch, scores)])
+        except Exception as e:
+            print(f"Warning: failed to store sentiment scores: {e}")
+
+    def drain(self):
+        """Score whatever is still queued; registered to run at exit."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._score_and_write(batch)
@@ -1,11 +1,13 @@
 class MindBloomChat {
   constructor() {
     this.currentMood = null;
+    this.conversationId = null;
     this.isTyping = false;
     this.messageInput = document.getElementById('messageInput');
     this.sendBtn = document.getElementById('sendBtn');
     this.chatMessages = document.getElementById('chatMessages');
     this.newCheckinBtn = document.getElementById('newCheckinBtn');
+    this.crisisModal = document.getElementById('crisisModal');
     this.init();
   }
 
@@ -16,6 +18,7 @@ class MindBloomChat {
     this.setupQuickReplies();
     this.setupMoodSelector();
     this.setupNavigation();
+    this.setupCrisisModal();
   }
 
   setupEventListeners() {
@@ -72,6 +75,23 @@ class MindBloomChat {
     });
   }
 
+  setupCrisisModal() {
+    if (!this.crisisModal) return;
+    document.querySelector('.crisis-btn')?.addEventListener('click', () => this.showCrisisModal());
+    this.crisisModal.querySelector('.modal-close')?.addEventListener('click', () => this.hideCrisisModal());
+    this.crisisModal.addEventListener('click', (e) => {
+      if (e.target === this.crisisModal) this.hideCrisisModal();
+    });
+  }
+
+  showCrisisModal() {
+    this.crisisModal?.classList.add('show');
+  }
+
+  hideCrisisModal() {
+    this.crisisModal?.classList.remove('show');
+  }
+
   selectMood(selectedBtn) {
     document.querySelectorAll('.mood-btn').forEach(btn => btn.classList.remove('active'));
     selectedBtn.classList.add('active');
@@ -79,6 +99,11 @@ class MindBloomChat {
   }
 
   async sendMoodUpdate(mood) {
+    fetch("/api/mood", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ mood })
+    }).catch(() => {});
     const moodMessages = {
       'Anxious': "I'm feeling anxious right now",
       'Calm': "I'm feeling calm at the moment",
@@ -111,20 +136,59 @@ class MindBloomChat {
   async generateBotResponse(userMessage) {
     this.showTypingIndicator();
     try {
-      const response = await fetch("/api/chat", {
+      const response = await fetch("/api/chat/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: userMessage })
+        body: JSON.stringify({ message: userMessage, conversation_id: this.conversationId })
       });
-      const data = await response.json();
-      this.hideTypingIndicator();
-      this.addMessage('bot', data.response, this.getCurrentTime());
+      if (!response.ok || !response.body) {
+        throw new Error(`Stream request failed: ${response.status}`);
+      }
+      await this.readReplyStream(response.body);
     } catch (error) {
       this.hideTypingIndicator();
       this.addMessage('bot', "Sorry, I'm having trouble responding right now. Please try again.", this.getCurrentTime());
     }
   }
 
+  async readReplyStream(body) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let textEl = null;
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const event of events) {
+        if (!event.startsWith('data: ')) continue;
+        const data = JSON.parse(event.slice(6));
+        if (data.conversation_id) {
+          this.conversationId = data.conversation_id;
+        }
+        if (data.type === 'crisis') {
+          this.showCrisisModal();
+        }
+        if (data.type === 'chunk') {
+          if (!textEl) {
+            this.hideTypingIndicator();
+            textEl = this.addMessage('bot', '', this.getCurrentTime());
+          }
+          textEl.textContent += data.text;
+          this.scrollToBottom();
+        }
+        if (data.type === 'done' && data.truncated) {
+          this.addMessage('bot', "Sorry, my reply was cut off. Please try again.", this.getCurrentTime());
+        }
+      }
+    }
+    if (!textEl) {
+      throw new Error('Stream ended without a reply');
+    }
+  }
+
   addMessage(sender, text, time) {
     // Find the .message-group container inside .chat-messages
     let messageGroup = this.chatMessages.querySelector('.message-group');
@@ -160,6 +224,7 @@ class MindBloomChat {
     messageDiv.appendChild(contentDiv);
     messageGroup.appendChild(messageDiv);
     this.scrollToBottom();
+    return contentDiv.querySelector('.message-text');
   }
 
   scrollToBottom() {
@@ -184,6 +249,7 @@ class MindBloomChat {
   }
 
   startNewCheckin() {
+    this.conversationId = null;
     this.messageInput.value = '';
     this.validateInput();
   }
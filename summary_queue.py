@@ -0,0 +1,57 @@
+"""Rolling-summary folds, run after the response instead of on the request path."""
+import queue
+import threading
+
+
+class SummaryQueue:
+    """Runs ``fold(conversation_id)`` on a few daemon threads.
+
+    A conversation that is already waiting is not queued twice. When the
+    queue is full the request is dropped; the next turn in that conversation
+    schedules the fold again. The threads start on first use, so they belong
+    to the worker process rather than a preloading parent.
+    """
+
+    def __init__(self, fold, workers=2, max_pending=256):
+        self.fold = fold
+        self.workers = workers
+        self.dropped = 0
+        self._queue = queue.Queue(max_pending)
+        self._pending = set()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def put(self, conversation_id):
+        self._ensure_started()
+        with self._lock:
+            if conversation_id in self._pending:
+                return
+            try:
+                self._queue.put_nowait(conversation_id)
+            except queue.Full:
+                self.dropped += 1
+                return
+            self._pending.add(conversation_id)
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f'summary-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            conversation_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(conversation_id)
+            try:
+                self.fold(conversation_id)
+            except Exception as e:
+                print(f"Warning: failed to update conversation summary: {e}")
+
+    def depth(self):
+        return self._queue.qsize()
@@ -0,0 +1,55 @@
+"""Per-process cache of the user loaded for each authenticated request."""
+from flask_login import UserMixin
+
+from response_cache import MemoryBackend
+
+
+class UserSnapshot(UserMixin):
+    """Read-only copy of the User columns needed to serve a request.
+
+    It is not bound to any session, so it can be shared between requests
+    and threads without touching the database.
+    """
+
+    def __init__(self, id, username, email, created_at):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+
+
+class UserCache:
+    """LRU/TTL cache in front of ``loader(user_id) -> UserSnapshot | None``.
+
+    Missing users are not cached. Invalidation only reaches the current
+    process; other workers see a change once their entry expires.
+    """
+
+    def __init__(self, loader, max_entries=10000, ttl=60):
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self._backend = MemoryBackend(max_entries, ttl)
+
+    def get(self, user_id):
+        snapshot = self._backend.get(user_id)
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        snapshot = self.loader(user_id)
+        if snapshot is not None:
+            self._backend.set(user_id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self._backend.delete(user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._backend),
+        }
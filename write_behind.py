@@ -0,0 +1,99 @@
+"""Group commit for rows that do not need to be read back within the request."""
+import atexit
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """Buffers rows and hands them to ``write`` in batches on one thread.
+
+    A batch is written as soon as ``max_batch`` rows are waiting or
+    ``interval`` seconds after its first row arrived, whichever comes first,
+    so a row is never buffered much longer than ``interval``. ``put`` blocks
+    when ``max_size`` rows are already waiting, which applies back-pressure
+    instead of growing without bound. ``close`` (also run at exit) writes
+    everything still buffered before returning.
+    """
+
+    _STOP = object()
+
+    def __init__(self, write, max_batch=256, interval=0.05, max_size=10000, retries=3):
+        self.write = write
+        self.max_batch = max_batch
+        self.interval = interval
+        self.retries = retries
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self._queue = queue.Queue(max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def put(self, row):
+        if self._closed:
+            # Late writes during shutdown go straight to the database.
+            self._write_batch([row])
+            return
+        self._ensure_started()
+        self._queue.put(row)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is self._STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._write_batch(batch)
+        # Anything enqueued after the stop marker.
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._write_batch(leftover)
+
+    def _write_batch(self, batch):
+        for attempt in range(self.retries):
+            try:
+                self.write(batch)
+                self.batches += 1
+                self.rows += len(batch)
+                return
+            except Exception as e:
+                error = e
+                time.sleep(0.05 * 2 ** attempt)
+        self.failed += len(batch)
+        print(f"Warning: write-behind batch of {len(batch)} rows failed: {error}")
+
+    def close(self, timeout=10):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)